@@ -1,12 +1,20 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
+import hmac
 import json
-import uvicorn
-from model.agent import Agent
-from utils.web_search import search_web
+import os
+import uuid
+from typing import Dict, Any
+from model.agent import Agent, DEFAULT_SESSION
+from utils.web_search import search_web_async
+from utils.admission import AdmissionController, AdmissionRejected, PRIORITY_LOW
+from utils.session_store import SessionStore
+from utils.search_prefetch import SearchPrefetcher, prefetch_stats
+from utils.profiling import profiling, sample_stacks
+from utils.process_stats import process_stats
 
 app = FastAPI()
 
@@ -19,50 +27,191 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create an instance of the agent
-agent = Agent()
+# Conversation turns survive restarts and are shared between workers
+session_store = SessionStore(os.environ.get("SESSION_DB", "data/sessions.db"))
+
+# Bounded concurrency and wait queues per endpoint class
+admission = AdmissionController()
+
+# Create an instance of the agent (MODEL_PATH=cpu-stand-in selects the CPU stand-in model)
+agent = Agent(os.environ.get("MODEL_PATH"), session_store=session_store, admission=admission)
+
+# Maximum number of concurrent generations on a single WebSocket
+MAX_INFLIGHT_PER_SOCKET = 4
+
+# Token required by the sampling profiler endpoint; the endpoint is off without it
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN")
+MAX_PROFILE_SECONDS = 60
+_sampling_lock = asyncio.Lock()
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.on_event("shutdown")
+def close_session_store():
+    session_store.close()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def get_home():
     with open("frontend/index.html", "r") as f:
         return f.read()
 
 
+def _profile_requested(request) -> bool:
+    """Per-request profiling is opted into with an X-Profile header or ?profile=1."""
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+
 @app.post("/api/chat")
-async def chat(request_data: dict):
+async def chat(request_data: dict, request: Request):
     try:
         message = request_data.get("message", "")
         if not message:
             raise HTTPException(status_code=400, detail="Message is required")
+        session_id = str(request_data.get("session_id") or DEFAULT_SESSION)
 
-        response = agent.process_message(message)
+        profile_enabled = _profile_requested(request)
+        with profiling(profile_enabled) as profile:
+            async with admission.slot("chat"):
+                response = await agent.process_message_async(message, session_id)
+        if profile_enabled:
+            return {"response": response, "profile": profile.to_dict()}
         return {"response": response}
+    except (HTTPException, AdmissionRejected):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
+    """
+    Multiplexed chat socket.
+
+    Client frames:
+        {"type": "message", "id": "<request id>", "session_id": "...", "message": "...",
+         "profile": false}
+        {"type": "cancel", "id": "<request id>"}
+        {"type": "draft", "message": "<partial input>"}
+
+    Server frames are tagged with the request id they belong to:
+        {"id": ..., "chunk": "..."}, {"id": ..., "done": true},
+        {"id": ..., "cancelled": true}, {"id": ..., "error": "..."}
+
+    Every message runs as its own task, so several requests can stream at
+    once. Cancelling a request, or closing the socket, cancels its task and
+    with it the in-flight search and generation. Drafts are optional; they
+    let the server start a likely search before the message is sent.
+
+    Messages with "profile": true, or every message on a socket opened with
+    ?profile=1, get a stage profile attached to their done frame.
+    """
     await websocket.accept()
+    profile_socket = _profile_requested(websocket)
+    tasks: Dict[str, asyncio.Task] = {}
+    prefetcher = SearchPrefetcher(agent.mcp, admission)
+    send_lock = asyncio.Lock()
+
+    async def send(frame: Dict[str, Any]) -> None:
+        # Tasks interleave their chunks, so serialize writes to the socket
+        async with send_lock:
+            await websocket.send_text(json.dumps(frame))
+
+    async def run(request_id: str, message: str, session_id: str, profile_enabled: bool) -> None:
+        try:
+            with profiling(profile_enabled) as profile:
+                async with admission.slot("stream"):
+                    async for chunk in agent.process_message_stream(message, session_id, prefetcher):
+                        await send({"id": request_id, "chunk": chunk})
+
+            # Send a completion signal
+            done = {"id": request_id, "done": True}
+            if profile_enabled:
+                done["profile"] = profile.to_dict()
+            await send(done)
+        except asyncio.CancelledError:
+            raise
+        except AdmissionRejected as e:
+            await send({"id": request_id, "error": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            await send({"id": request_id, "error": str(e)})
+        finally:
+            if tasks.get(request_id) is asyncio.current_task():
+                del tasks[request_id]
+
     try:
         while True:
-            data = await websocket.receive_text()
-            data = json.loads(data)
-            message = data.get("message", "")
+            text = await websocket.receive_text()
 
-            # Process the message through the agent with streaming
-            async for chunk in agent.process_message_stream(message):
-                await websocket.send_text(json.dumps({"chunk": chunk}))
+            # A bad frame only fails itself; other requests on the socket carry on
+            try:
+                data = json.loads(text)
+            except ValueError:
+                await send({"error": "Frame is not valid JSON"})
+                continue
+            if not isinstance(data, dict):
+                await send({"error": "Frame must be a JSON object"})
+                continue
+            frame_type = data.get("type", "message")
 
-            # Send a completion signal
-            await websocket.send_text(json.dumps({"done": True}))
+            if frame_type == "draft":
+                prefetcher.on_draft(str(data.get("message", "")))
+                continue
+
+            request_id = str(data.get("id") or uuid.uuid4().hex)
+
+            if frame_type == "cancel":
+                task = tasks.pop(request_id, None)
+                if task is not None:
+                    task.cancel()
+                    await send({"id": request_id, "cancelled": True})
+                continue
+
+            if frame_type != "message":
+                await send({"id": request_id, "error": f"Unknown frame type: {frame_type}"})
+                continue
+
+            message = data.get("message", "")
+            if not message:
+                await send({"id": request_id, "error": "Message is required"})
+                continue
+            if not isinstance(message, str):
+                await send({"id": request_id, "error": "Message must be a string"})
+                continue
+            if request_id in tasks:
+                await send({"id": request_id, "error": "Request id is already in flight"})
+                continue
+            if len(tasks) >= MAX_INFLIGHT_PER_SOCKET:
+                await send({"id": request_id, "error": "Too many requests in flight"})
+                continue
+
+            session_id = str(data.get("session_id") or DEFAULT_SESSION)
+            profile_enabled = profile_socket or bool(data.get("profile"))
+            tasks[request_id] = asyncio.create_task(run(request_id, message, session_id, profile_enabled))
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         await websocket.send_text(json.dumps({"error": str(e)}))
         await websocket.close()
+    finally:
+        # Nobody is listening any more; free the compute
+        prefetcher.close()
+        pending = list(tasks.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
 
 @app.post("/api/train")
@@ -71,8 +220,14 @@ async def train_model(request_data: dict):
         data_path = request_data.get("data_path", "data/processed")
         epochs = request_data.get("epochs", 5)
 
-        result = agent.train(data_path, epochs)
+        async with admission.slot("train", priority=PRIORITY_LOW):
+            result = await asyncio.to_thread(agent.train, data_path, epochs)
         return {"status": "success", "result": result}
+    except (HTTPException, AdmissionRejected):
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400,
+                            detail=f"{e}; run preprocess_data first (python -m model.training)")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -84,11 +239,50 @@ async def search(request_data: dict):
         if not query:
             raise HTTPException(status_code=400, detail="Query is required")
 
-        results = search_web(query)
+        async with admission.slot("search"):
+            results = await search_web_async(query)
         return {"results": results}
+    except (HTTPException, AdmissionRejected):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/admin/profile", response_class=PlainTextResponse)
+async def sample_profile(request: Request, seconds: float = 5.0, interval_ms: float = 10.0):
+    """
+    Sample every thread in this worker and return collapsed stacks.
+
+    Requires the X-Admin-Token header to match PROFILER_TOKEN.
+    """
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Constant-time comparison, so response timing doesn't leak the token
+    supplied = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(supplied.encode("utf-8"), PROFILER_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if _sampling_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    interval = max(interval_ms, 1.0) / 1000
+    async with _sampling_lock:
+        return await asyncio.to_thread(sample_stacks, seconds, interval)
+
+
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "admission": admission.stats(),
+        "batching": agent.batcher.stats() if agent.batcher else None,
+        "sessions": session_store.stats(),
+        "prefetch": prefetch_stats(),
+        "worker": process_stats(),
+    }
+
+
 if __name__ == "__main__":
+    # Development server; use serve.py to run several workers in production
+    import uvicorn
+
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1 @@
+# Lets the tests import the app's packages from the repository root
@@ -3,138 +3,207 @@ document.addEventListener('DOMContentLoaded', function() {
     const messagesContainer = document.getElementById('chat-messages');
     const userInput = document.getElementById('user-input');
     const sendButton = document.getElementById('send-button');
-    
+    const stopButton = document.getElementById('stop-button');
+
     // WebSocket connection
     let socket = null;
-    let isStreaming = false;
-    let currentAssistantMessage = null;
-    
+    let nextRequestId = 1;
+
+    // In-flight requests, keyed by request id
+    const activeRequests = new Map();
+
+    // Conversation id, kept across reloads so the server can restore history
+    let sessionId = localStorage.getItem('chatSessionId');
+    if (!sessionId) {
+        sessionId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        localStorage.setItem('chatSessionId', sessionId);
+    }
+
     // Connect WebSocket
     function connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const wsUrl = `${protocol}//${window.location.host}/ws/chat`;
-        
+
         socket = new WebSocket(wsUrl);
-        
+
         socket.onopen = function() {
             console.log('WebSocket connected');
         };
-        
+
         socket.onmessage = function(event) {
             const data = JSON.parse(event.data);
-            
+            const request = data.id !== undefined ? activeRequests.get(data.id) : null;
+
             if (data.error) {
                 addMessage('system', `Error: ${data.error}`);
-                isStreaming = false;
+                finishRequest(data.id);
                 return;
             }
-            
+
+            // Chunks for requests we already cancelled can still be in flight
+            if (!request) return;
+
             if (data.chunk) {
-                if (!isStreaming) {
-                    // Start a new assistant message
-                    isStreaming = true;
-                    currentAssistantMessage = document.createElement('div');
-                    currentAssistantMessage.className = 'message assistant';
-                    
+                if (!request.element) {
+                    // Start a new assistant message for this request
+                    request.element = document.createElement('div');
+                    request.element.className = 'message assistant';
+
                     const content = document.createElement('div');
                     content.className = 'message-content';
-                    currentAssistantMessage.appendChild(content);
-                    
-                    messagesContainer.appendChild(currentAssistantMessage);
+                    request.element.appendChild(content);
+
+                    messagesContainer.appendChild(request.element);
                 }
-                
-                // Append to current message
-                const content = currentAssistantMessage.querySelector('.message-content');
+
+                // Append to this request's message
+                const content = request.element.querySelector('.message-content');
                 content.textContent += data.chunk;
-                
+
                 // Scroll to bottom
                 messagesContainer.scrollTop = messagesContainer.scrollHeight;
             }
-            
-            if (data.done) {
-                isStreaming = false;
-                currentAssistantMessage = null;
-                
-                // Enable input after response is complete
-                userInput.disabled = false;
-                sendButton.disabled = false;
-                userInput.focus();
+
+            if (data.done || data.cancelled) {
+                finishRequest(data.id);
             }
         };
-        
+
         socket.onclose = function() {
+            // The server cancels everything in flight when the socket drops
+            activeRequests.clear();
+            updateControls();
             console.log('WebSocket disconnected. Reconnecting in 3 seconds...');
             setTimeout(connectWebSocket, 3000);
         };
-        
+
         socket.onerror = function(error) {
             console.error('WebSocket error:', error);
         };
     }
-    
+
     // Initialize WebSocket connection
     connectWebSocket();
-    
+
     // Add a message to the chat
     function addMessage(role, text) {
         const message = document.createElement('div');
         message.className = `message ${role}`;
-        
+
         const content = document.createElement('div');
         content.className = 'message-content';
         content.textContent = text;
-        
+
         message.appendChild(content);
         messagesContainer.appendChild(message);
-        
+
         // Scroll to bottom
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
     }
-    
+
+    // Show the stop button only while something is streaming
+    function updateControls() {
+        stopButton.disabled = activeRequests.size === 0;
+    }
+
+    function finishRequest(id) {
+        activeRequests.delete(id);
+        updateControls();
+    }
+
+    // Send a frame, reconnecting first if needed
+    function sendFrame(frame, onFailure) {
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify(frame));
+            return;
+        }
+
+        addMessage('system', 'WebSocket connection is not open. Reconnecting...');
+        connectWebSocket();
+        setTimeout(function() {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify(frame));
+            } else {
+                addMessage('system', 'Failed to connect. Please try again later.');
+                if (onFailure) onFailure();
+            }
+        }, 1000);
+    }
+
+    // Share partial input so the server can start a likely search early
+    const DRAFT_DELAY_MS = 300;
+    const DRAFT_MIN_LENGTH = 6;
+    let draftTimer = null;
+    let lastDraft = '';
+
+    function sendDraft() {
+        const draft = userInput.value.trim();
+        if (draft.length < DRAFT_MIN_LENGTH || draft === lastDraft) return;
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            lastDraft = draft;
+            socket.send(JSON.stringify({ type: 'draft', session_id: sessionId, message: draft }));
+        }
+    }
+
+    userInput.addEventListener('input', function() {
+        clearTimeout(draftTimer);
+        draftTimer = setTimeout(sendDraft, DRAFT_DELAY_MS);
+    });
+
     // Send a message
     function sendMessage() {
         const message = userInput.value.trim();
         if (!message) return;
-        
+
+        clearTimeout(draftTimer);
+        lastDraft = '';
+
         // Add user message to chat
         addMessage('user', message);
-        
+
         // Clear input
         userInput.value = '';
-        
-        // Disable input while waiting for response
-        userInput.disabled = true;
-        sendButton.disabled = true;
-        
-        // Send message via WebSocket
-        if (socket && socket.readyState === WebSocket.OPEN) {
-            socket.send(JSON.stringify({ message }));
-        } else {
-            addMessage('system', 'WebSocket connection is not open. Reconnecting...');
-            connectWebSocket();
-            setTimeout(function() {
-                if (socket && socket.readyState === WebSocket.OPEN) {
-                    socket.send(JSON.stringify({ message }));
-                } else {
-                    addMessage('system', 'Failed to connect. Please try again later.');
-                    userInput.disabled = false;
-                    sendButton.disabled = false;
-                }
-            }, 1000);
-        }
+        userInput.focus();
+
+        // Track the request so its chunks land in their own message
+        const id = String(nextRequestId++);
+        activeRequests.set(id, { element: null });
+        updateControls();
+
+        sendFrame({ type: 'message', id, session_id: sessionId, message }, function() {
+            finishRequest(id);
+        });
+    }
+
+    // Cancel every in-flight request
+    function cancelAll() {
+        activeRequests.forEach(function(request, id) {
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify({ type: 'cancel', id }));
+            }
+        });
+        activeRequests.clear();
+        updateControls();
     }
-    
+
     // Event listeners
     sendButton.addEventListener('click', sendMessage);
-    
+    stopButton.addEventListener('click', cancelAll);
+
     userInput.addEventListener('keydown', function(event) {
         // Send on Enter (without Shift)
         if (event.key === 'Enter' && !event.shiftKey) {
             event.preventDefault();
             sendMessage();
         }
+
+        // Stop generating on Escape
+        if (event.key === 'Escape') {
+            cancelAll();
+        }
     });
-    
+
     // Focus input on page load
+    updateControls();
     userInput.focus();
 });
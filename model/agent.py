@@ -1,25 +1,75 @@
 import asyncio
 import json
 import os
+import threading
 import time
-from typing import List, Dict, Any, AsyncGenerator
+from collections import OrderedDict
+from typing import List, Dict, Any, AsyncGenerator, Optional
 
 from .mcp import MessageCoherenceProtocol
-from utils.web_search import search_web
+from .batching import InferenceBatcher, DeterministicCPUModel
+from .context import ContextBuilder, make_turn
+from .records import Role, Turn, MCPResult
+from utils.web_search import search_web, search_web_async
+from utils.session_store import SessionStore
+from utils.admission import AdmissionController
+from utils.search_prefetch import SearchPrefetcher
+from utils.profiling import current_profile
+
+
+# Model path that selects the deterministic CPU stand-in model
+STAND_IN_MODEL = "cpu-stand-in"
+
+# Session used when callers don't name one
+DEFAULT_SESSION = "default"
+
+
+class _Session:
+    """A cached session history and the newest stored turn it reflects."""
+
+    __slots__ = ("turns", "synced_id", "loaded", "version")
+
+    def __init__(self):
+        self.turns = []
+        self.synced_id = 0
+        # False until the history has been read from the store
+        self.loaded = False
+        # Bumped by every recorded exchange, so reloads can tell they raced one
+        self.version = 0
 
 
 class Agent:
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, session_store: Optional[SessionStore] = None,
+                 max_sessions: int = 1024, history_window: int = 50,
+                 admission: Optional[AdmissionController] = None):
         """
         Initialize the agent with optional model path.
 
         Args:
             model_path: Path to a pre-trained model (if available)
+            session_store: Durable store for conversation turns (if available)
+            max_sessions: Sessions kept in memory when a store is available
+            history_window: Turns kept in memory and loaded from the store per session
+            admission: Admission controller whose search slots bound the agent's searches
         """
         self.mcp = MessageCoherenceProtocol()
         self.model_path = model_path
         self.model = self._load_model() if model_path else None
-        self.conversation_history = []
+        self.context_builder = ContextBuilder()
+
+        # In-memory histories by session id, least recently used first
+        self.session_store = session_store
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self.history_window = history_window
+        # Requests run on the event loop and in worker threads alike
+        self._sessions_lock = threading.Lock()
+
+        # Searches share the "search" slots with /api/search and speculative prefetches
+        self.admission = admission
+
+        # Concurrent streaming requests share batched model calls
+        self.batcher = InferenceBatcher(self._generate_batch_from_model) if self.model else None
 
     def _load_model(self):
         """Load a pre-trained model if available."""
@@ -27,6 +77,8 @@ class Agent:
             # Here you would implement your model loading logic
             # This is a placeholder
             print(f"Loading model from {self.model_path}")
+            if self.model_path == STAND_IN_MODEL:
+                return DeterministicCPUModel()
             # model = YourModelClass.load(self.model_path)
             # return model
             return None
@@ -34,88 +86,277 @@ class Agent:
             print(f"Error loading model: {e}")
             return None
 
-    def process_message(self, message: str) -> str:
+    def warmup(self) -> None:
+        """
+        Exercise the serving path once so lazily built state exists up front.
+
+        Run this in a master process before forking workers, so the model,
+        the MCP keyword matchers and the caches they populate are created
+        once and shared copy-on-write instead of being rebuilt per worker.
+        """
+        result = self.mcp.process("what is this warm-up message?", [])
+        result.prompt = self.context_builder.build([make_turn(Role.USER, result.message)])
+        if self.model:
+            self._generate_batch_from_model([result])
+
+    @property
+    def conversation_history(self) -> List[Turn]:
+        """History of the default session."""
+        return self._get_history(DEFAULT_SESSION)
+
+    def _get_history(self, session_id: str) -> List[Turn]:
+        """
+        Return a session's history, loading recent turns from the store when needed.
+
+        A cached history is only reused while no other worker has written to
+        the session since it was loaded; otherwise it is reloaded, so workers
+        sharing a store see each other's turns once they are committed.
+
+        This queries the store and may wait for its writer, so code on the
+        event loop calls it through asyncio.to_thread. The sessions lock is
+        never held across store access, so recording an exchange on the event
+        loop doesn't wait on the disk.
+
+        Args:
+            session_id: The conversation to look up
+
+        Returns:
+            A copy of the session's turns, oldest first
+        """
+        store = self.session_store
+        while True:
+            with self._sessions_lock:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    session = self.sessions[session_id] = _Session()
+                    # Idle sessions can be reloaded from the store, so only evict when there is one
+                    if store and len(self.sessions) > self.max_sessions:
+                        self.sessions.popitem(last=False)
+                self.sessions.move_to_end(session_id)
+                if not store:
+                    session.loaded = True
+                turns = list(session.turns)
+                synced_id = session.synced_id
+                loaded = session.loaded
+                version = session.version
+
+            if loaded and (not store or not store.written_elsewhere(session_id, synced_id)):
+                return turns
+
+            # Turns this worker queued but hasn't committed yet would be missing
+            if store.pending(session_id):
+                store.flush()
+            stored = store.load_recent(session_id, self.history_window)
+
+            with self._sessions_lock:
+                # An exchange recorded meanwhile may be missing from what was read; read again
+                if self.sessions.get(session_id) is not session or session.version != version:
+                    continue
+                session.turns = [Turn(row["role"], row["content"], row["tokens"]) for row in stored]
+                session.synced_id = stored[-1]["id"] if stored else 0
+                session.loaded = True
+                return list(session.turns)
+
+    def _record_exchange(self, session_id: str, user_turn: Turn, response: str) -> None:
+        """
+        Add a completed exchange to a session's history and queue it for persistence.
+
+        Requests build their context from a snapshot of the history and only
+        record their user and assistant turns together once the response is
+        complete, so concurrent requests in one session never interleave.
+        """
+        assistant_turn = make_turn(Role.ASSISTANT, response)
+        with self._sessions_lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.version += 1
+                session.turns += (user_turn, assistant_turn)
+                # Older turns live on in the store; keep memory per session bounded
+                if len(session.turns) > self.history_window:
+                    del session.turns[:-self.history_window]
+            if self.session_store:
+                for turn in (user_turn, assistant_turn):
+                    self.session_store.append(session_id, turn.role.value, turn.content, turn.tokens)
+
+    def process_message(self, message: str, session_id: str = DEFAULT_SESSION) -> str:
         """
         Process a message and return a response.
 
+        This blocks and calls the model on its own; code running on the
+        event loop should use process_message_async so its generation is
+        batched with concurrent requests.
+
         Args:
             message: The user's message
+            session_id: The conversation the message belongs to
 
         Returns:
             The agent's response
         """
-        # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": message})
+        profile = current_profile()
+
+        with profile.stage("history"):
+            history = self._get_history(session_id)
+            user_turn = make_turn(Role.USER, message)
+            history.append(user_turn)
 
         # Use MCP to process the message
-        mcp_result = self.mcp.process(message, self.conversation_history)
+        with profile.stage("mcp"):
+            mcp_result = self.mcp.process(message, history)
 
         # Check if we need web search
-        if mcp_result.get("needs_search", False):
-            search_query = mcp_result.get("search_query", message)
-            search_results = search_web(search_query)
+        if mcp_result.needs_search:
+            search_query = mcp_result.search_query
+            with profile.stage("search"):
+                search_results = search_web(search_query)
             # Add search results to the context
-            mcp_result["context"] = search_results
+            mcp_result.context = search_results
+
+        # Fit history and search results into the model's token budget
+        with profile.stage("context"):
+            mcp_result.prompt = self.context_builder.build(history, mcp_result.context)
 
         # Generate response (placeholder - in a real system, this would use your model)
-        if self.model:
-            response = self._generate_from_model(mcp_result)
-        else:
-            # Fallback response when no model is loaded
-            response = "I understand you're asking about " + message + ". Let me think about that."
+        with profile.stage("generate"):
+            if self.model:
+                response = self._generate_from_model(mcp_result)
+            else:
+                # Fallback response when no model is loaded
+                response = "I understand you're asking about " + message + ". Let me think about that."
+
+        # Add the exchange to history
+        with profile.stage("history"):
+            self._record_exchange(session_id, user_turn, response)
+
+        return response
+
+    async def process_message_async(self, message: str, session_id: str = DEFAULT_SESSION) -> str:
+        """
+        Process a message on the event loop and return a response.
+
+        Args:
+            message: The user's message
+            session_id: The conversation the message belongs to
+
+        Returns:
+            The agent's response
+        """
+        profile = current_profile()
+
+        with profile.stage("history"):
+            history = await asyncio.to_thread(self._get_history, session_id)
+            user_turn = make_turn(Role.USER, message)
+            history.append(user_turn)
+
+        # Use MCP to process the message
+        with profile.stage("mcp"):
+            mcp_result = self.mcp.process(message, history)
+
+        # Check if we need web search
+        if mcp_result.needs_search:
+            search_query = mcp_result.search_query
+            with profile.stage("search"):
+                search_results = await self._search_async(search_query)
+            # Add search results to the context
+            mcp_result.context = search_results
 
-        # Add response to history
-        self.conversation_history.append({"role": "assistant", "content": response})
+        # Fit history and search results into the model's token budget
+        with profile.stage("context"):
+            mcp_result.prompt = self.context_builder.build(history, mcp_result.context)
+
+        # Generate response, sharing model calls with concurrent requests
+        with profile.stage("generate"):
+            if self.model:
+                response = await self.batcher.submit(mcp_result)
+            else:
+                # Fallback response when no model is loaded
+                response = "I understand you're asking about " + message + ". Let me think about that."
+
+        # Add the exchange to history
+        with profile.stage("history"):
+            self._record_exchange(session_id, user_turn, response)
 
         return response
 
-    async def process_message_stream(self, message: str) -> AsyncGenerator[str, None]:
+    async def process_message_stream(self, message: str, session_id: str = DEFAULT_SESSION,
+                                     prefetcher: Optional[SearchPrefetcher] = None) -> AsyncGenerator[str, None]:
         """
         Process a message and stream the response.
 
         Args:
             message: The user's message
+            session_id: The conversation the message belongs to
+            prefetcher: Speculative searches started from the user's drafts
 
         Returns:
             An async generator yielding chunks of the response
+
+        Cancelling the consuming task stops the generation at the next chunk
+        boundary; the exchange is only recorded once the response has been
+        streamed in full, so a cancelled request leaves no turns behind.
         """
-        # Add to conversation history
-        self.conversation_history.append({"role": "user", "content": message})
+        profile = current_profile()
+
+        with profile.stage("history"):
+            history = await asyncio.to_thread(self._get_history, session_id)
+            user_turn = make_turn(Role.USER, message)
+            history.append(user_turn)
 
         # Use MCP to process the message
-        mcp_result = self.mcp.process(message, self.conversation_history)
+        with profile.stage("mcp"):
+            mcp_result = self.mcp.process(message, history)
 
         # Check if we need web search
-        if mcp_result.get("needs_search", False):
-            search_query = mcp_result.get("search_query", message)
-            search_results = search_web(search_query)
-            # Add search results to the context
-            mcp_result["context"] = search_results
+        if mcp_result.needs_search:
+            search_query = mcp_result.search_query
             # Yield search notification
             yield "Searching the web for information..."
+            with profile.stage("search"):
+                # Reuse a search started while the user was still typing
+                search_results = await prefetcher.take(search_query) if prefetcher else None
+                if search_results is None:
+                    # Cancelling this generator aborts the search along with it
+                    search_results = await self._search_async(search_query)
+            # Add search results to the context
+            mcp_result.context = search_results
             await asyncio.sleep(0.5)
 
+        # Fit history and search results into the model's token budget
+        with profile.stage("context"):
+            mcp_result.prompt = self.context_builder.build(history, mcp_result.context)
+
         # Generate response (placeholder - in a real system, this would stream from your model)
         if self.model:
-            response = self._generate_from_model(mcp_result)
+            with profile.stage("generate"):
+                response = await self.batcher.submit(mcp_result)
             # Simulate streaming with chunks
-            words = response.split()
-            for i in range(0, len(words), 3):
-                chunk = " ".join(words[i:i + 3])
-                yield chunk + " "
-                await asyncio.sleep(0.1)
+            with profile.stage("stream"):
+                words = response.split()
+                for i in range(0, len(words), 3):
+                    chunk = " ".join(words[i:i + 3])
+                    yield chunk + " "
+                    await asyncio.sleep(0.1)
         else:
             # Fallback response when no model is loaded
             response = "I understand you're asking about " + message + ". Let me think about that."
             # Simulate streaming
-            for word in response.split():
-                yield word + " "
-                await asyncio.sleep(0.1)
+            with profile.stage("stream"):
+                for word in response.split():
+                    yield word + " "
+                    await asyncio.sleep(0.1)
+
+        # Add the exchange to history once the response has been streamed in full
+        with profile.stage("history"):
+            self._record_exchange(session_id, user_turn, response)
 
-        # Add complete response to history
-        self.conversation_history.append({"role": "assistant", "content": response})
+    async def _search_async(self, query: str) -> List[Dict[str, Any]]:
+        """Search the web, holding a search slot when admission control is in use."""
+        if self.admission is None:
+            return await search_web_async(query)
+        async with self.admission.slot("search"):
+            return await search_web_async(query)
 
-    def _generate_from_model(self, context: Dict[str, Any]) -> str:
+    def _generate_from_model(self, context: MCPResult) -> str:
         """
         Generate a response using the loaded model.
 
@@ -125,13 +366,35 @@ class Agent:
         Returns:
             The generated response
         """
+        return self._generate_batch_from_model([context])[0]
+
+    def _generate_batch_from_model(self, contexts: List[MCPResult]) -> List[str]:
+        """
+        Generate responses for a batch of contexts in one model call.
+
+        Args:
+            contexts: One context per request
+
+        Returns:
+            The generated responses, in the same order
+        """
+        if hasattr(self.model, "generate_batch"):
+            return self.model.generate_batch(contexts)
+
         # This is a placeholder for actual model inference
         # In a real implementation, you would:
-        # 1. Format the input for your model
+        # 1. Format context["prompt"]["messages"] for your model
         # 2. Run inference
         # 3. Post-process the output
 
-        return f"Based on your query, I found the following information: {context.get('search_query', 'No specific query found')}."
+        responses = []
+        for context in contexts:
+            prompt = context.prompt
+            # The prompt ends with the user's message, after any history and snippets
+            query = context.get("search_query") or prompt["messages"][-1]["content"]
+            sources = f" from {prompt['snippets']} search results" if prompt["snippets"] else ""
+            responses.append(f"Based on your query, I found the following information{sources}: {query}.")
+        return responses
 
     def train(self, data_path: str, epochs: int = 5) -> Dict[str, Any]:
         """
@@ -144,22 +407,34 @@ class Agent:
         Returns:
             Training results
         """
-        # This is a placeholder for the actual training logic
-        # In a real implementation, you would:
-        # 1. Load the Q&A data
-        # 2. Preprocess it
-        # 3. Train your model
-        # 4. Save the trained model
+        # Batches are streamed, shuffled, tokenized and prefetched by the loader;
+        # the training step itself is still a placeholder. In a real implementation,
+        # you would run your model's forward/backward pass on each batch and save
+        # the trained model at the end.
+
+        # Training code isn't needed for serving, so it is imported on first use
+        from .data_loader import QADataLoader
 
         print(f"Training on data from {data_path} for {epochs} epochs")
 
-        # Simulate training
-        time.sleep(2)
+        loader = QADataLoader(data_path)
+        start = time.perf_counter()
+        for epoch in range(epochs):
+            for batch in loader:
+                pass
+        training_time = time.perf_counter() - start
+
+        stats = loader.stats()
+        print(f"Trained on {stats['samples']} samples at {stats['samples_per_sec']:.0f} samples/sec "
+              f"({stats['stall_time']:.3f}s stalled on data)")
 
-        # Return mock results
+        # Loss and accuracy are mock values until a real model is trained
         return {
             "epochs_completed": epochs,
             "final_loss": 0.05,
             "accuracy": 0.95,
-            "training_time": 2.0
-        }
\ No newline at end of file
+            "training_time": training_time,
+            "samples": stats["samples"],
+            "samples_per_sec": stats["samples_per_sec"],
+            "stall_time": stats["stall_time"],
+        }
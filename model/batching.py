@@ -0,0 +1,206 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import List, Dict, Any, Callable, Optional
+
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batching for model inference.
+
+    Concurrent callers submit one generation request each. A single worker
+    collects queued requests into a batch until either ``max_batch_size``
+    requests are waiting or the oldest one has waited ``max_wait`` seconds,
+    runs the batch through ``batch_fn`` in one call, and hands every caller
+    its own result.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Dict[str, Any]]], List[str]],
+                 max_batch_size: int = 8, max_wait: float = 0.01):
+        """
+        Args:
+            batch_fn: Blocking function mapping a list of contexts to a list of responses
+            max_batch_size: Upper bound on requests per batch
+            max_wait: Longest time the first request of a batch waits for company
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_sizes = Counter()
+        self.queue_delays = deque(maxlen=1024)
+        self.requests = 0
+        self.batches = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        """Start the worker on the running loop, restarting it if the loop changed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, context: Dict[str, Any]) -> str:
+        """
+        Queue a generation request and wait for its result.
+
+        Args:
+            context: The context including message, history, and search results
+
+        Returns:
+            The generated response
+        """
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((context, future, time.monotonic()))
+        return await future
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = batch[0][2] + self.max_wait
+
+            # Fill the batch until it is full or the oldest request has waited long enough
+            while len(batch) < self.max_batch_size:
+                # Requests that are already waiting never delay the batch
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that went away while queued don't need a result
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            for _, _, enqueued in batch:
+                self.queue_delays.append(started - enqueued)
+            self.batch_sizes[len(batch)] += 1
+            self.batches += 1
+            self.requests += len(batch)
+
+            try:
+                results = await asyncio.to_thread(self.batch_fn, [item[0] for item in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size distribution and queueing delay percentiles."""
+        delays = sorted(self.queue_delays)
+
+        def percentile(p: float) -> float:
+            if not delays:
+                return 0.0
+            return delays[min(len(delays) - 1, int(p * len(delays)))]
+
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_delay_p50": percentile(0.5),
+            "queue_delay_p95": percentile(0.95),
+            "queue_delay_max": delays[-1] if delays else 0.0,
+        }
+
+
+class DeterministicCPUModel:
+    """
+    Deterministic CPU stand-in for a real model.
+
+    It hashes the input into a bag-of-words matrix and runs one batched
+    matrix product to pick output words, so results are reproducible and
+    the cost structure (fixed per-call overhead plus vectorized per-row
+    work) resembles real batched inference.
+    """
+
+    vocab = ["the", "answer", "depends", "on", "context", "and", "details",
+             "of", "your", "question", "information", "suggests", "that", "this", "is", "relevant"]
+
+    def __init__(self, dim: int = 256, output_words: int = 12, call_overhead: float = 0.005, seed: int = 0):
+        # Deferred so serving without a model doesn't pay for importing NumPy
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.output_words = output_words
+        self.call_overhead = call_overhead
+        self.weights = rng.standard_normal((dim, len(self.vocab) * output_words)).astype(np.float32)
+
+    @staticmethod
+    def _input_text(ctx: Dict[str, Any]) -> str:
+        """The text the model reads: the assembled prompt, or the bare message without one."""
+        prompt = ctx.get("prompt")
+        if prompt:
+            return "\n".join(message["content"] for message in prompt["messages"])
+        return ctx.get("search_query") or ctx.get("message", "")
+
+    def _encode(self, text: str):
+        import numpy as np
+
+        row = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            # Stable across processes, unlike hash()
+            row[sum(word.encode("utf-8")) % self.dim] += 1.0
+        return row
+
+    def generate_batch(self, contexts: List[Dict[str, Any]]) -> List[str]:
+        import numpy as np
+
+        # Per-call setup cost that batching amortizes
+        time.sleep(self.call_overhead)
+
+        inputs = np.stack([self._encode(self._input_text(ctx)) for ctx in contexts])
+        logits = (inputs @ self.weights).reshape(len(contexts), self.output_words, len(self.vocab))
+        choices = logits.argmax(axis=2)
+
+        return [" ".join(self.vocab[i] for i in row) + "." for row in choices]
+
+
+async def _benchmark(num_requests: int, max_batch_size: int, max_wait: float) -> Dict[str, Any]:
+    model = DeterministicCPUModel()
+    batcher = InferenceBatcher(model.generate_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+    contexts = [{"message": f"question number {i}"} for i in range(num_requests)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(batcher.submit(ctx) for ctx in contexts))
+    elapsed = time.perf_counter() - start
+
+    # Batched results must match unbatched ones exactly
+    if results != [model.generate_batch([ctx])[0] for ctx in contexts]:
+        raise RuntimeError("Batched results differ from unbatched ones")
+
+    stats = batcher.stats()
+    stats["elapsed"] = elapsed
+    return stats
+
+
+def main() -> None:
+    """Compare unbatched and batched throughput on the CPU stand-in model."""
+    for max_batch_size in (1, 8, 32):
+        stats = asyncio.run(_benchmark(256, max_batch_size, max_wait=0.005))
+        print(f"max_batch_size={max_batch_size}: {stats['requests'] / stats['elapsed']:.0f} req/s, "
+              f"avg batch {stats['avg_batch_size']:.1f}, "
+              f"queue delay p50 {stats['queue_delay_p50'] * 1000:.1f}ms p95 {stats['queue_delay_p95'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
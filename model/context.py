@@ -0,0 +1,192 @@
+import re
+from typing import List, Dict, Any, Optional
+
+from .records import Turn
+
+
+# Approximate tokenizer: one token per CJK character, word or punctuation mark
+_TOKEN_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]|\w+|[^\w\s]")
+
+_SNIPPETS_HEADER = "Search results:\n"
+_SUMMARY_HEADER = "Earlier conversation:\n"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into tokens.
+
+    Args:
+        text: The text to split
+
+    Returns:
+        The tokens, in order
+    """
+    return _TOKEN_RE.findall(text)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of text.
+
+    Args:
+        text: The text to count
+
+    Returns:
+        The approximate number of tokens
+    """
+    return sum(1 for _ in _TOKEN_RE.finditer(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text down to at most max_tokens tokens.
+
+    Args:
+        text: The text to truncate
+        max_tokens: The number of tokens to keep
+
+    Returns:
+        The truncated text, with an ellipsis if anything was cut; the
+        ellipsis counts as one of the max_tokens tokens
+    """
+    if max_tokens <= 0:
+        return ""
+    cut = 0
+    for i, match in enumerate(_TOKEN_RE.finditer(text)):
+        if i == max_tokens - 1:
+            cut = match.start()
+        elif i == max_tokens:
+            return text[:cut].rstrip() + "…"
+    return text
+
+
+def make_turn(role: str, content: str) -> Turn:
+    """Create a history entry with its token count cached alongside."""
+    return Turn(role, content, count_tokens(content))
+
+
+def turn_tokens(turn: Turn) -> int:
+    """Cached token count of a history entry, counting it once if missing."""
+    tokens = turn.tokens
+    if tokens is None:
+        tokens = turn.tokens = count_tokens(turn.content)
+    return tokens
+
+
+class ContextBuilder:
+    """
+    Assemble model input under a fixed token budget.
+
+    The budget is filled in priority order: the system prompt, the most
+    recent turns, then the top search snippets. Older turns that no longer
+    fit are collapsed into short summaries while room remains, and dropped
+    after that. Every turn and snippet is visited at most once, so a build
+    is linear in the size of its inputs.
+    """
+
+    def __init__(self, token_budget: int = 2048,
+                 system_prompt: str = "You are a helpful assistant.",
+                 snippet_reserve: int = 512,
+                 max_recent_turns: int = 8,
+                 summary_tokens_per_turn: int = 24):
+        """
+        Args:
+            token_budget: Total tokens available for the prompt
+            system_prompt: Prompt that always leads the context
+            snippet_reserve: Tokens held back from history for search snippets
+            max_recent_turns: Turns kept verbatim before older ones are collapsed
+            summary_tokens_per_turn: Length of each collapsed older turn
+        """
+        self.token_budget = token_budget
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt)
+        self.snippet_reserve = snippet_reserve
+        self.max_recent_turns = max_recent_turns
+        self.summary_tokens_per_turn = summary_tokens_per_turn
+
+    def build(self, history: List[Turn],
+              search_results: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Build the prompt messages for the latest turn.
+
+        Args:
+            history: Conversation history, oldest first, ending with the user's message
+            search_results: Search results ranked best first
+
+        Returns:
+            A dictionary with the prompt messages and token accounting
+        """
+        remaining = self.token_budget - self.system_tokens
+
+        # Only hold back as much of the reserve as the snippets actually need
+        snippets = []
+        snippet_tokens = count_tokens(_SNIPPETS_HEADER)
+        for result in search_results or []:
+            text = f"{result.get('title', '')}: {result.get('snippet', '')}"
+            tokens = count_tokens(text)
+            if snippet_tokens + tokens > self.snippet_reserve:
+                break
+            snippets.append(text)
+            snippet_tokens += tokens
+        if not snippets:
+            snippet_tokens = 0
+
+        # Most recent turns, newest first; the latest turn always goes in
+        recent = []
+        history_budget = remaining - snippet_tokens
+        index = len(history) - 1
+        while index >= 0 and len(recent) < self.max_recent_turns:
+            turn = history[index]
+            tokens = turn_tokens(turn)
+            if tokens > history_budget:
+                if not recent:
+                    content = truncate_to_tokens(turn.content, history_budget)
+                    recent.append({"role": turn.role, "content": content})
+                    history_budget -= count_tokens(content)
+                    index -= 1
+                break
+            recent.append({"role": turn.role, "content": turn.content})
+            history_budget -= tokens
+            index -= 1
+        remaining = history_budget + snippet_tokens
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+
+        if snippets:
+            text = _SNIPPETS_HEADER + "\n".join(snippets)
+            messages.append({"role": "system", "content": text})
+            remaining -= snippet_tokens
+
+        # Collapse older turns, newest first, into whatever room is left
+        summaries = []
+        summarized = 0
+        summary_header_tokens = count_tokens(_SUMMARY_HEADER)
+        remaining -= summary_header_tokens
+        while index >= 0 and remaining > 0:
+            turn = history[index]
+            summary = f"{turn.role}: {truncate_to_tokens(turn.content, self.summary_tokens_per_turn)}"
+            tokens = count_tokens(summary)
+            if tokens > remaining:
+                break
+            summaries.append(summary)
+            remaining -= tokens
+            summarized += 1
+            index -= 1
+
+        if summaries:
+            summaries.reverse()
+            messages.insert(1, {"role": "system", "content": _SUMMARY_HEADER + "\n".join(summaries)})
+        else:
+            remaining += summary_header_tokens
+
+        recent.reverse()
+        messages.extend(recent)
+
+        return {
+            "messages": messages,
+            "token_count": self.token_budget - remaining,
+            "recent_turns": len(recent),
+            "summarized_turns": summarized,
+            "dropped_turns": index + 1,
+            "snippets": len(snippets),
+        }
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+from typing import List, Dict, Any, Iterator, Optional
+
+import numpy as np
+
+from .context import tokenize
+
+
+PAD_ID = 0
+BOS_ID = 1
+SEP_ID = 2
+EOS_ID = 3
+_NUM_SPECIAL = 4
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def resolve_data_file(data_path: str) -> str:
+    """
+    Find the Q&A file to train on.
+
+    Args:
+        data_path: A processed data file, or the directory written by preprocess_data
+
+    Returns:
+        Path to the training file
+    """
+    if os.path.isfile(data_path):
+        return data_path
+    for name in ("train_data.json", "qa_data.json", "train_data.jsonl", "qa_data.jsonl"):
+        path = os.path.join(data_path, name)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"No processed Q&A data found in {data_path}")
+
+
+def iter_records(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Stream Q&A records without loading the whole file.
+
+    Supports JSON Lines and the JSON array written by preprocess_data.
+
+    Args:
+        path: Path to the data file
+        chunk_size: Characters read per chunk
+
+    Returns:
+        An iterator over the records
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer) and not eof:
+                # Parsed text is only dropped when reading more, not after every record
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            if not started:
+                if not buffer.startswith("[", pos):
+                    raise ValueError(f"{path} is not a JSON array")
+                pos += 1
+                started = True
+                continue
+
+            # Skip separators between elements
+            if buffer.startswith(",", pos):
+                pos += 1
+                continue
+            if buffer.startswith("]", pos):
+                return
+
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The element is cut off at the end of the buffer; read more
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+
+
+class HashingTokenizer:
+    """Map tokens to ids by hashing, so no vocabulary file is needed."""
+
+    def __init__(self, vocab_size: int = 32768, max_length: int = 256):
+        self.vocab_size = vocab_size
+        self.max_length = max_length
+
+    def _ids(self, text: str) -> List[int]:
+        buckets = self.vocab_size - _NUM_SPECIAL
+        return [_NUM_SPECIAL + zlib.crc32(token.encode("utf-8")) % buckets for token in tokenize(text)]
+
+    def encode_pair(self, question: str, answer: str) -> np.ndarray:
+        """Encode a Q&A pair as [BOS] question [SEP] answer [EOS], truncated to max_length."""
+        ids = [BOS_ID] + self._ids(question) + [SEP_ID] + self._ids(answer) + [EOS_ID]
+        return np.asarray(ids[:self.max_length], dtype=np.int32)
+
+    def signature(self) -> str:
+        return f"hashing-{self.vocab_size}-{self.max_length}"
+
+
+class QADataLoader:
+    """
+    Mini-batch loader over processed Q&A data.
+
+    Records are streamed from disk and shuffled through a bounded shuffle
+    buffer, so memory stays flat however large the data set is. Tokenized
+    records are written to an on-disk cache during the first full pass and
+    memory-mapped on later epochs and runs. Batches are built on a
+    background thread, ``prefetch`` batches ahead of the consumer.
+    """
+
+    def __init__(self, data_path: str, batch_size: int = 32, shuffle_buffer: int = 1024,
+                 prefetch: int = 4, cache_dir: Optional[str] = None,
+                 tokenizer: Optional[HashingTokenizer] = None, seed: int = 0):
+        """
+        Args:
+            data_path: Processed data file or directory
+            batch_size: Records per batch
+            shuffle_buffer: Records held in memory for shuffling
+            prefetch: Batches prepared ahead of the consumer
+            cache_dir: Directory for tokenized caches; defaults to <data dir>/cache
+            tokenizer: Tokenizer for Q&A pairs
+            seed: Seed for shuffling; each epoch uses seed + epoch
+        """
+        self.path = resolve_data_file(data_path)
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.prefetch = prefetch
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(self.path), "cache")
+        self.tokenizer = tokenizer or HashingTokenizer()
+        self.seed = seed
+        self.epoch = 0
+
+        self.samples = 0
+        self.batches = 0
+        self.elapsed = 0.0
+        self.stall_time = 0.0
+        self.cache_hits = 0
+
+    def _cache_prefix(self) -> str:
+        stat = os.stat(self.path)
+        key = f"{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}:{self.tokenizer.signature()}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+    def _iter_sequences(self, stop: threading.Event) -> Iterator[np.ndarray]:
+        """Yield tokenized records from the cache, filling it on a miss."""
+        prefix = self._cache_prefix()
+        ids_path, offsets_path = prefix + ".ids.bin", prefix + ".offsets.npy"
+
+        if os.path.exists(offsets_path):
+            self.cache_hits += 1
+            offsets = np.load(offsets_path)
+            ids = np.memmap(ids_path, dtype=np.int32, mode="r") if offsets[-1] else np.zeros(0, dtype=np.int32)
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                if stop.is_set():
+                    return
+                yield ids[start:end]
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{ids_path}.{os.getpid()}.tmp"
+        offsets = [0]
+        complete = False
+        try:
+            with open(tmp_path, "wb") as out:
+                for record in iter_records(self.path):
+                    if stop.is_set():
+                        return
+                    if "question" not in record or "answer" not in record:
+                        continue
+                    seq = self.tokenizer.encode_pair(str(record["question"]), str(record["answer"]))
+                    seq.tofile(out)
+                    offsets.append(offsets[-1] + len(seq))
+                    yield seq
+            complete = True
+        finally:
+            # Only a full pass is a valid cache
+            if complete:
+                os.replace(tmp_path, ids_path)
+                # The offsets file marks the cache as valid, so it goes in last
+                with open(tmp_path, "wb") as out:
+                    np.save(out, np.asarray(offsets, dtype=np.int64))
+                os.replace(tmp_path, offsets_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _iter_shuffled(self, stop: threading.Event, rng: random.Random) -> Iterator[np.ndarray]:
+        buffer = []
+        for seq in self._iter_sequences(stop):
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(seq)
+                continue
+            # Emit a random element and take its place
+            i = rng.randrange(len(buffer))
+            buffer[i], seq = seq, buffer[i]
+            yield seq
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _collate(self, sequences: List[np.ndarray]) -> Dict[str, np.ndarray]:
+        length = max(len(seq) for seq in sequences)
+        input_ids = np.full((len(sequences), length), PAD_ID, dtype=np.int32)
+        attention_mask = np.zeros((len(sequences), length), dtype=np.int8)
+        for row, seq in enumerate(sequences):
+            input_ids[row, :len(seq)] = seq
+            attention_mask[row, :len(seq)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+    def _produce(self, out: queue.Queue, stop: threading.Event, epoch: int) -> None:
+        try:
+            rng = random.Random(self.seed + epoch)
+            pending = []
+            for seq in self._iter_shuffled(stop, rng):
+                pending.append(seq)
+                if len(pending) == self.batch_size:
+                    batch = self._collate(pending)
+                    pending = []
+                    # Time out now and then so a stopped consumer can't leave us blocked
+                    while not stop.is_set():
+                        try:
+                            out.put(batch, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+            if pending and not stop.is_set():
+                out.put(self._collate(pending))
+            out.put(None)
+        except BaseException as e:
+            out.put(e)
+
+    def __iter__(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Iterate over one epoch of batches."""
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(out, stop, self.epoch),
+                                    name="qa-data-loader", daemon=True)
+        self.epoch += 1
+        start = time.perf_counter()
+        producer.start()
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = out.get()
+                self.stall_time += time.perf_counter() - wait_start
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self.samples += len(item["input_ids"])
+                self.batches += 1
+                yield item
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue
+            while producer.is_alive():
+                try:
+                    out.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.elapsed += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput and time spent waiting on the producer."""
+        return {
+            "samples": self.samples,
+            "batches": self.batches,
+            "samples_per_sec": self.samples / self.elapsed if self.elapsed else 0.0,
+            "stall_time": self.stall_time,
+            "cache_hits": self.cache_hits,
+        }
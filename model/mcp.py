@@ -1,5 +1,16 @@
+import re
 from typing import List, Dict, Any
 
+from .records import Intent, Strategy, MCPResult
+
+
+# Default strategy based on intent
+_INTENT_STRATEGY = {
+    Intent.CHAT: Strategy.CONVERSATIONAL,
+    Intent.HELP: Strategy.HELPFUL,
+    Intent.EXPLAIN: Strategy.INFORMATIVE
+}
+
 
 class MessageCoherenceProtocol:
     """
@@ -9,13 +20,44 @@ class MessageCoherenceProtocol:
 
     def __init__(self):
         self.intent_map = {
-            "search": ["search", "find", "look up", "google", "information about", "tell me about"],
-            "chat": ["chat", "talk", "conversation", "discuss"],
-            "help": ["help", "assist", "support"],
-            "explain": ["explain", "describe", "what is", "how does", "why is"]
+            Intent.SEARCH: ["search", "find", "look up", "google", "information about", "tell me about"],
+            Intent.CHAT: ["chat", "talk", "conversation", "discuss"],
+            Intent.HELP: ["help", "assist", "support"],
+            Intent.EXPLAIN: ["explain", "describe", "what is", "how does", "why is"]
         }
+        self.search_indicators = [
+            "find information",
+            "search for",
+            "look up",
+            "what is",
+            "who is",
+            "where is",
+            "when was",
+            "how to",
+            "latest news",
+            "recent events"
+        ]
+        self.compile()
+
+    def compile(self) -> None:
+        """
+        Build the keyword matchers from intent_map and search_indicators.
+
+        Call again after changing either. The matchers are read-only once
+        built, so a protocol created before forking workers is shared by them.
+        """
+        self._intent_patterns = [
+            (intent, self._keyword_pattern(keywords))
+            for intent, keywords in self.intent_map.items()
+        ]
+        self._search_indicator_pattern = self._keyword_pattern(self.search_indicators)
+
+    @staticmethod
+    def _keyword_pattern(keywords: List[str]) -> "re.Pattern":
+        """A pattern matching any of the keywords as a substring."""
+        return re.compile("|".join(re.escape(keyword) for keyword in keywords))
 
-    def process(self, message: str, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def process(self, message: str, history: List[Dict[str, Any]]) -> MCPResult:
         """
         Process a message using MCP.
 
@@ -24,7 +66,8 @@ class MessageCoherenceProtocol:
             history: Conversation history
 
         Returns:
-            A dictionary with processing results and metadata
+            An MCPResult with processing results and metadata; it supports
+            dict-style access
         """
         # Convert message to lowercase for intent matching
         message_lower = message.lower()
@@ -47,17 +90,17 @@ class MessageCoherenceProtocol:
         # Determine appropriate response strategy
         response_strategy = self._determine_response_strategy(intent, needs_search, coherence_score)
 
-        return {
-            "message": message,
-            "intent": intent,
-            "needs_search": needs_search,
-            "search_query": search_query,
-            "entities": entities,
-            "coherence_score": coherence_score,
-            "response_strategy": response_strategy
-        }
-
-    def _detect_intent(self, message: str) -> str:
+        return MCPResult(
+            message=message,
+            intent=intent,
+            needs_search=needs_search,
+            search_query=search_query,
+            entities=entities,
+            coherence_score=coherence_score,
+            response_strategy=response_strategy
+        )
+
+    def _detect_intent(self, message: str) -> Intent:
         """
         Detect the user's intent from the message.
 
@@ -67,14 +110,14 @@ class MessageCoherenceProtocol:
         Returns:
             The detected intent
         """
-        for intent, keywords in self.intent_map.items():
-            if any(keyword in message for keyword in keywords):
+        for intent, pattern in self._intent_patterns:
+            if pattern.search(message):
                 return intent
 
         # Default to chat if no specific intent is detected
-        return "chat"
+        return Intent.CHAT
 
-    def _needs_search(self, message: str, intent: str) -> bool:
+    def _needs_search(self, message: str, intent: Intent) -> bool:
         """
         Determine if the message requires web search.
 
@@ -86,24 +129,11 @@ class MessageCoherenceProtocol:
             True if search is needed, False otherwise
         """
         # Check if the intent is search
-        if intent == "search":
+        if intent == Intent.SEARCH:
             return True
 
         # Check for explicit search requests
-        search_indicators = [
-            "find information",
-            "search for",
-            "look up",
-            "what is",
-            "who is",
-            "where is",
-            "when was",
-            "how to",
-            "latest news",
-            "recent events"
-        ]
-
-        if any(indicator in message for indicator in search_indicators):
+        if self._search_indicator_pattern.search(message):
             return True
 
         # Check for factual questions that might need search
@@ -203,7 +233,7 @@ class MessageCoherenceProtocol:
 
         return normalized_score
 
-    def _determine_response_strategy(self, intent: str, needs_search: bool, coherence_score: float) -> str:
+    def _determine_response_strategy(self, intent: Intent, needs_search: bool, coherence_score: float) -> Strategy:
         """
         Determine the appropriate response strategy.
 
@@ -213,24 +243,17 @@ class MessageCoherenceProtocol:
             coherence_score: The coherence score
 
         Returns:
-            A response strategy string
+            A response strategy
         """
         if needs_search:
-            return "search_and_respond"
+            return Strategy.SEARCH_AND_RESPOND
 
         if coherence_score < 0.2:
             # Very low coherence might indicate a topic change
-            return "address_topic_change"
+            return Strategy.ADDRESS_TOPIC_CHANGE
 
         if coherence_score > 0.8:
             # High coherence suggests continuing the current topic
-            return "continue_topic"
-
-        # Default strategy based on intent
-        intent_strategy_map = {
-            "chat": "conversational",
-            "help": "helpful",
-            "explain": "informative"
-        }
+            return Strategy.CONTINUE_TOPIC
 
-        return intent_strategy_map.get(intent, "conversational")
\ No newline at end of file
+        return _INTENT_STRATEGY.get(intent, Strategy.CONVERSATIONAL)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import json
+import sys
+import tracemalloc
+from enum import Enum
+from typing import List, Dict, Any, Optional
+
+
+class _StrEnum(str, Enum):
+    """Enum whose members are interned strings that compare, hash and print as their value."""
+
+    def __str__(self) -> str:
+        return self.value
+
+    def __format__(self, spec: str) -> str:
+        return self.value.__format__(spec)
+
+
+class Role(_StrEnum):
+    SYSTEM = "system"
+    USER = "user"
+    ASSISTANT = "assistant"
+
+
+class Intent(_StrEnum):
+    SEARCH = "search"
+    CHAT = "chat"
+    HELP = "help"
+    EXPLAIN = "explain"
+
+
+class Strategy(_StrEnum):
+    SEARCH_AND_RESPOND = "search_and_respond"
+    ADDRESS_TOPIC_CHANGE = "address_topic_change"
+    CONTINUE_TOPIC = "continue_topic"
+    CONVERSATIONAL = "conversational"
+    HELPFUL = "helpful"
+    INFORMATIVE = "informative"
+
+
+class _Record:
+    """Dict-style access over ``__slots__`` for code that expects a mapping."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def keys(self) -> List[str]:
+        return [key for key in self.__slots__ if getattr(self, key) is not None]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, _Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Turn(_Record):
+    """One conversation turn with its cached token count."""
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: Optional[int] = None):
+        self.role = Role(role)
+        self.content = content
+        self.tokens = tokens
+
+
+class MCPResult(_Record):
+    """Result of MessageCoherenceProtocol.process, extended by the agent."""
+
+    __slots__ = ("message", "intent", "needs_search", "search_query", "entities",
+                 "coherence_score", "response_strategy", "context", "prompt")
+
+    def __init__(self, message: str, intent: Intent, needs_search: bool, search_query: str,
+                 entities: List[str], coherence_score: float, response_strategy: Strategy):
+        self.message = message
+        self.intent = intent
+        self.needs_search = needs_search
+        self.search_query = search_query
+        self.entities = entities
+        self.coherence_score = coherence_score
+        self.response_strategy = response_strategy
+        # Filled in by the agent
+        self.context = None
+        self.prompt = None
+
+
+def _measure(factory, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Exclude the list holding the items
+    return (after - before - sys.getsizeof(items)) / count
+
+
+def main() -> None:
+    """Compare bytes per turn and per MCP result for dicts and slotted records."""
+    count = 100000
+    # Same content object for every turn, so only the container is measured
+    content = "What is the capital of France?"
+
+    dict_turn = _measure(lambda i: {"role": "user", "content": content, "tokens": 7}, count)
+    slot_turn = _measure(lambda i: Turn("user", content, 7), count)
+    print(f"turn:       dict {dict_turn:.0f} B, slots {slot_turn:.0f} B")
+
+    fields = dict(message=content, needs_search=True, search_query=content,
+                  entities=["capital", "France?"], coherence_score=0.5)
+    dict_result = _measure(lambda i: dict(fields, intent="explain", response_strategy="search_and_respond",
+                                          context=None), count)
+    slot_result = _measure(lambda i: MCPResult(intent=Intent.EXPLAIN,
+                                               response_strategy=Strategy.SEARCH_AND_RESPOND, **fields), count)
+    print(f"mcp result: dict {dict_result:.0f} B, slots {slot_result:.0f} B")
+
+    # Records serialize like the dicts they replace
+    assert json.dumps(Turn("user", content, 7).to_dict()) == json.dumps({"role": "user", "content": content, "tokens": 7})
+
+
+if __name__ == "__main__":
+    main()
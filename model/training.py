@@ -1,6 +1,5 @@
 import os
 import json
-import pandas as pd
 from typing import List, Dict, Any
 import random
 
@@ -46,6 +45,8 @@ def preprocess_data(raw_data_path: str, output_path: str) -> None:
 def _process_csv(file_path: str) -> List[Dict[str, str]]:
     """Process a CSV file into Q&A pairs."""
     try:
+        import pandas as pd
+
         df = pd.read_csv(file_path)
 
         # Assume the CSV has 'question' and 'answer' columns
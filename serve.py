@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Preforked production launcher.
+
+The master process imports the app once, which builds the agent, loads the
+model and warms up the read-only serving state, binds the listening socket,
+then forks the workers. Workers inherit that state and share its memory
+pages copy-on-write instead of each building their own copy.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+
+# A worker that exits sooner than this after starting counts as a failed start
+MIN_UPTIME = 5.0
+# Restart delay after the first failed start, doubling with each one after it
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+# Failed starts in a row, per worker, before the launcher gives up
+MAX_FAILED_STARTS = 5
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, sock: socket.socket, app_module, forked_at: float, log_level: str) -> None:
+    import uvicorn
+    from utils.process_stats import record_startup, memory_usage
+
+    # Children of a forked master shouldn't inherit its handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    config = uvicorn.Config(app_module.app, log_level=log_level)
+    server = uvicorn.Server(config)
+
+    async def serve() -> None:
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.01)
+        if server.started:
+            startup = time.perf_counter() - forked_at
+            record_startup(startup)
+            memory = memory_usage()
+            print(f"[worker {index} pid {os.getpid()}] ready in {startup * 1000:.0f}ms; "
+                  f"rss {memory.get('rss_mb', 0):.1f}MB, shared {memory.get('shared_mb', 0):.1f}MB, "
+                  f"private {memory.get('private_mb', 0):.1f}MB", flush=True)
+        await task
+
+    asyncio.run(serve())
+
+
+def main() -> None:
+    """Load the app once and serve it from N forked workers."""
+    parser = argparse.ArgumentParser(description="Run the chat agent with preforked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import uvicorn  # noqa: F401  (imported here so workers inherit it)
+    import app as app_module
+
+    # Build lazily created state now, so workers inherit it instead of building it
+    app_module.agent.warmup()
+    print(f"[master pid {os.getpid()}] app loaded in {(time.perf_counter() - start) * 1000:.0f}ms", flush=True)
+
+    sock = _bind(args.host, args.port)
+
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers don't write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {}  # pid -> (index, started)
+    failed_starts = [0] * args.workers
+    stopping = False
+    exit_code = 0
+
+    def spawn(index: int) -> None:
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                _run_worker(index, sock, app_module, forked_at, args.log_level)
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                # Skip the master's cleanup handlers
+                os._exit(code)
+        workers[pid] = (index, time.monotonic())
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+
+    # Replace workers that die unexpectedly until asked to stop, backing off
+    # when they keep dying right after starting
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in workers:
+            continue
+        index, started = workers.pop(pid)
+        if stopping:
+            continue
+
+        if time.monotonic() - started < MIN_UPTIME:
+            failed_starts[index] += 1
+        else:
+            failed_starts[index] = 0
+        if failed_starts[index] >= MAX_FAILED_STARTS:
+            print(f"[master] worker {index} (pid {pid}) exited with status {status}; "
+                  f"giving up after {failed_starts[index]} failed starts in a row", flush=True)
+            exit_code = 1
+            stop(None, None)
+            continue
+
+        delay = 0.0
+        if failed_starts[index]:
+            delay = min(RESTART_DELAY * 2 ** (failed_starts[index] - 1), MAX_RESTART_DELAY)
+        print(f"[master] worker {index} (pid {pid}) exited with status {status}; "
+              f"restarting in {delay:.1f}s", flush=True)
+        # Sleep in short steps so a shutdown signal isn't held up by the delay
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, deadline - time.monotonic()))
+        if not stopping:
+            spawn(index)
+
+    sock.close()
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork(); use 'python app.py' on this platform")
+    main()
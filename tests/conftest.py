@@ -0,0 +1,18 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """Test client for the app, with its session store in a temporary directory."""
+    testclient = pytest.importorskip("fastapi.testclient")
+
+    # The app builds its session store on import
+    db_path = tmp_path_factory.mktemp("sessions") / "sessions.db"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SESSION_DB", str(db_path))
+        mp.delenv("MODEL_PATH", raising=False)
+        app_module = importlib.import_module("app")
+        with testclient.TestClient(app_module.app) as client:
+            yield client
@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+
+from utils.admission import (AdmissionController, AdmissionRejected,
+                             PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+
+def controller(max_concurrent: int = 1, max_queue: int = 4, max_wait: float = 5.0) -> AdmissionController:
+    return AdmissionController({"test": (max_concurrent, max_queue, max_wait)})
+
+
+def stats(admission: AdmissionController):
+    return admission.stats()["test"]
+
+
+def test_full_queue_is_rejected_with_429():
+    admission = controller(max_queue=1)
+
+    async def run():
+        await admission.acquire("test")
+        waiting = asyncio.create_task(admission.acquire("test"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("test")
+
+        admission.release("test")
+        await waiting
+        admission.release("test")
+        return rejected.value
+
+    rejected = asyncio.run(run())
+
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert stats(admission)["rejected_queue_full"] == 1
+    assert stats(admission)["in_flight"] == 0
+
+
+def test_waiter_past_its_deadline_is_rejected_with_503():
+    admission = controller(max_wait=0.05)
+
+    async def run():
+        await admission.acquire("test")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("test")
+        admission.release("test")
+        return rejected.value
+
+    rejected = asyncio.run(run())
+
+    assert rejected.status_code == 503
+    assert stats(admission)["rejected_timeout"] == 1
+    assert stats(admission)["queue_depth"] == 0
+    assert stats(admission)["in_flight"] == 0
+
+
+def test_no_wait_acquire_fails_fast_when_busy():
+    admission = controller()
+
+    async def run():
+        await admission.acquire("test")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("test", timeout=0)
+        admission.release("test")
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 503
+    assert stats(admission)["rejected_no_wait"] == 1
+    assert stats(admission)["queue_depth"] == 0
+
+
+def test_higher_priority_request_sheds_a_lower_one():
+    admission = controller(max_queue=1)
+
+    async def run():
+        await admission.acquire("test")
+        low = asyncio.create_task(admission.acquire("test", priority=PRIORITY_LOW))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(admission.acquire("test", priority=PRIORITY_HIGH))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as shed:
+            await low
+        admission.release("test")
+        await high
+        admission.release("test")
+        return shed.value
+
+    shed = asyncio.run(run())
+
+    assert shed.status_code == 503
+    assert stats(admission)["shed"] == 1
+    assert stats(admission)["in_flight"] == 0
+
+
+def test_equal_priority_request_does_not_shed():
+    admission = controller(max_queue=1)
+
+    async def run():
+        await admission.acquire("test")
+        first = asyncio.create_task(admission.acquire("test"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("test")
+        admission.release("test")
+        await first
+        admission.release("test")
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 429
+    assert stats(admission)["shed"] == 0
+
+
+def test_waiters_are_admitted_in_priority_order():
+    admission = controller()
+    order = []
+
+    async def run():
+        await admission.acquire("test")
+
+        async def request(name, priority):
+            await admission.acquire("test", priority=priority)
+            order.append(name)
+            admission.release("test")
+
+        tasks = []
+        for name, priority in [("low", PRIORITY_LOW), ("normal", PRIORITY_NORMAL), ("high", PRIORITY_HIGH)]:
+            tasks.append(asyncio.create_task(request(name, priority)))
+            await asyncio.sleep(0)
+        admission.release("test")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["high", "normal", "low"]
+    assert stats(admission)["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    admission = controller()
+
+    async def run():
+        await admission.acquire("test")
+        waiting = asyncio.create_task(admission.acquire("test"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        admission.release("test")
+
+        # Capacity is whole again: the next request starts without queueing
+        await admission.acquire("test", timeout=0)
+        admission.release("test")
+
+    asyncio.run(run())
+
+    assert stats(admission)["in_flight"] == 0
+    assert stats(admission)["queue_depth"] == 0
+
+
+def test_waiter_cancelled_after_being_granted_releases_its_slot():
+    admission = controller()
+
+    async def run():
+        await admission.acquire("test")
+        waiting = asyncio.create_task(admission.acquire("test"))
+        await asyncio.sleep(0)
+
+        # Grant the slot, then cancel before the waiter gets to run
+        admission.release("test")
+        assert stats(admission)["in_flight"] == 1
+        waiting.cancel()
+        results = await asyncio.gather(waiting, return_exceptions=True)
+
+        await admission.acquire("test", timeout=0)
+        admission.release("test")
+        return results
+
+    results = asyncio.run(run())
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert stats(admission)["in_flight"] == 0
+
+
+def test_slot_is_released_when_the_block_raises():
+    admission = controller()
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            async with admission.slot("test"):
+                raise RuntimeError("handler failed")
+
+    asyncio.run(run())
+
+    assert stats(admission)["in_flight"] == 0
+    assert stats(admission)["admitted"] == 1
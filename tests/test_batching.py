@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+
+from model.batching import InferenceBatcher
+
+
+class RecordingModel:
+    """Batch function that records every call and echoes each message."""
+
+    def __init__(self, delay: float = 0.0, fail_calls: int = 0):
+        self.delay = delay
+        self.fail_calls = fail_calls
+        self.calls = []
+
+    def __call__(self, contexts):
+        self.calls.append([ctx["message"] for ctx in contexts])
+        time.sleep(self.delay)
+        if len(self.calls) <= self.fail_calls:
+            raise RuntimeError("model failed")
+        return [f"reply to {ctx['message']}" for ctx in contexts]
+
+
+def test_batches_never_exceed_max_batch_size():
+    model = RecordingModel()
+    batcher = InferenceBatcher(model, max_batch_size=4, max_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit({"message": str(i)}) for i in range(10)))
+
+    asyncio.run(run())
+
+    assert all(len(call) <= 4 for call in model.calls)
+    assert sum(len(call) for call in model.calls) == 10
+    # Requests that are already queued fill the batch without waiting
+    assert [len(call) for call in model.calls] == [4, 4, 2]
+
+
+def test_lone_request_waits_at_most_max_wait():
+    model = RecordingModel()
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait=0.05)
+
+    async def run():
+        start = time.monotonic()
+        await batcher.submit({"message": "alone"})
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+
+    assert model.calls == [["alone"]]
+    assert 0.04 <= elapsed < 0.5
+
+
+def test_late_request_goes_into_the_next_batch():
+    model = RecordingModel()
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait=0.02)
+
+    async def run():
+        first = asyncio.create_task(batcher.submit({"message": "first"}))
+        await asyncio.sleep(0.2)
+        second = asyncio.create_task(batcher.submit({"message": "second"}))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == ["reply to first", "reply to second"]
+    assert model.calls == [["first"], ["second"]]
+
+
+def test_results_are_routed_to_their_callers():
+    model = RecordingModel(delay=0.01)
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait=0.01)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit({"message": str(i)}) for i in range(20)))
+
+    assert asyncio.run(run()) == [f"reply to {i}" for i in range(20)]
+    assert len(model.calls) > 1
+
+
+def test_cancelled_callers_are_left_out_of_the_batch():
+    model = RecordingModel(delay=0.1)
+    batcher = InferenceBatcher(model, max_batch_size=1, max_wait=0.0)
+
+    async def run():
+        # Occupies the worker while the next two requests queue up
+        busy = asyncio.create_task(batcher.submit({"message": "busy"}))
+        await asyncio.sleep(0.02)
+        cancelled = asyncio.create_task(batcher.submit({"message": "cancelled"}))
+        kept = asyncio.create_task(batcher.submit({"message": "kept"}))
+        await asyncio.sleep(0.02)
+        cancelled.cancel()
+        results = await asyncio.gather(busy, kept)
+        return results, cancelled.cancelled()
+
+    results, was_cancelled = asyncio.run(run())
+
+    assert was_cancelled
+    assert results == ["reply to busy", "reply to kept"]
+    assert model.calls == [["busy"], ["kept"]]
+    assert batcher.requests == 2
+
+
+def test_batch_fn_errors_reach_every_caller_in_the_batch():
+    model = RecordingModel(fail_calls=1)
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait=0.05)
+
+    async def run():
+        failed = await asyncio.gather(*(batcher.submit({"message": str(i)}) for i in range(3)),
+                                      return_exceptions=True)
+        # The worker keeps serving after a failed batch
+        recovered = await batcher.submit({"message": "again"})
+        return failed, recovered
+
+    failed, recovered = asyncio.run(run())
+
+    assert len(model.calls[0]) == 3
+    assert all(isinstance(result, RuntimeError) for result in failed)
+    assert recovered == "reply to again"
+
+
+def test_batched_stand_in_results_match_unbatched():
+    pytest.importorskip("numpy")
+    from model.batching import DeterministicCPUModel
+
+    model = DeterministicCPUModel(call_overhead=0.0)
+    batcher = InferenceBatcher(model.generate_batch, max_batch_size=8, max_wait=0.01)
+    contexts = [{"message": f"question number {i}"} for i in range(16)]
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(ctx) for ctx in contexts))
+
+    assert asyncio.run(run()) == [model.generate_batch([ctx])[0] for ctx in contexts]
@@ -0,0 +1,46 @@
+import pytest
+
+from model.context import ContextBuilder, count_tokens, make_turn, truncate_to_tokens
+from model.records import Role
+
+
+def message_tokens(prompt):
+    return sum(count_tokens(message["content"]) for message in prompt["messages"])
+
+
+@pytest.mark.parametrize("max_tokens", range(0, 6))
+def test_truncation_stays_within_max_tokens(max_tokens):
+    text = "one two three four five six"
+    truncated = truncate_to_tokens(text, max_tokens)
+
+    assert count_tokens(truncated) <= max_tokens
+    if max_tokens:
+        assert truncated.endswith("…")
+
+
+def test_text_that_fits_is_not_truncated():
+    assert truncate_to_tokens("one two three", 3) == "one two three"
+
+
+def test_oversized_latest_turn_is_cut_to_the_budget():
+    message = " ".join(f"word{i}" for i in range(200))
+    prompt = ContextBuilder(token_budget=50).build([make_turn(Role.USER, message)])
+
+    assert prompt["token_count"] == message_tokens(prompt) == 50
+    assert prompt["messages"][-1]["content"].endswith("…")
+
+
+@pytest.mark.parametrize("token_budget", [40, 100, 400])
+def test_prompt_never_exceeds_the_budget(token_budget):
+    history = []
+    for i in range(30):
+        history.append(make_turn(Role.USER, f"question {i} " + "detail " * (i % 7)))
+        history.append(make_turn(Role.ASSISTANT, f"answer {i} " + "context " * (i % 11)))
+    results = [{"title": f"Result {i}", "snippet": "snippet text " * 10} for i in range(5)]
+
+    builder = ContextBuilder(token_budget=token_budget, snippet_reserve=token_budget // 4)
+    prompt = builder.build(history, results)
+
+    assert prompt["token_count"] == message_tokens(prompt)
+    assert prompt["token_count"] <= token_budget
+    assert (prompt["recent_turns"] + prompt["summarized_turns"] + prompt["dropped_turns"]) == len(history)
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+from model.data_loader import iter_records, resolve_data_file
+
+
+RECORDS = [
+    {"question": "What is the capital of France?", "answer": "Paris."},
+    {"question": "Tricky [brackets], {braces} and \"quotes\"", "answer": "a, b ] c"},
+    {"question": "Unicode: 東京 café", "answer": "…\n\tand escapes \\"},
+    {"question": "", "answer": ""},
+]
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_records_split_across_chunks(tmp_path, chunk_size, indent):
+    path = write(tmp_path, "qa_data.json", json.dumps(RECORDS * 3, indent=indent, ensure_ascii=False))
+
+    assert list(iter_records(path, chunk_size=chunk_size)) == RECORDS * 3
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ \n ]  ", "\n[\n]\n"])
+def test_empty_array(tmp_path, text):
+    assert list(iter_records(write(tmp_path, "qa_data.json", text), chunk_size=2)) == []
+
+
+@pytest.mark.parametrize("text", ["[", '[{"question": "a"},', '[{"question": "a"}, {"quest', '[{"question": "a"}'])
+def test_truncated_array_raises(tmp_path, text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(write(tmp_path, "qa_data.json", text), chunk_size=3))
+
+
+@pytest.mark.parametrize("text", ["", "   ", '{"question": "a"}'])
+def test_non_array_raises(tmp_path, text):
+    with pytest.raises(ValueError, match="not a JSON array"):
+        list(iter_records(write(tmp_path, "qa_data.json", text)))
+
+
+def test_json_lines(tmp_path):
+    text = "\n".join(json.dumps(record) for record in RECORDS) + "\n\n"
+
+    assert list(iter_records(write(tmp_path, "qa_data.jsonl", text))) == RECORDS
+
+
+def test_missing_processed_data(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        resolve_data_file(str(tmp_path))
+
+
+def test_train_without_processed_data_is_a_client_error(client, tmp_path):
+    response = client.post("/api/train", json={"data_path": str(tmp_path), "epochs": 1})
+
+    assert response.status_code == 400
+    assert "run preprocess_data first" in response.json()["detail"]
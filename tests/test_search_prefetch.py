@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import model.agent
+import utils.search_prefetch
+from model.agent import Agent
+from model.mcp import MessageCoherenceProtocol
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.search_prefetch import SearchPrefetcher, prefetch_stats
+
+
+QUERY = "what is the capital of France?"
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Replace the web search with a quick fake that records its queries."""
+    queries = []
+
+    async def fake_search(query, num_results=5):
+        queries.append(query)
+        await asyncio.sleep(0.01)
+        return [{"title": f"Result for {query}", "snippet": "snippet", "url": "https://example.com"}]
+
+    monkeypatch.setattr(utils.search_prefetch, "search_web_async", fake_search)
+    monkeypatch.setattr(model.agent, "search_web_async", fake_search)
+    return queries
+
+
+def prefetcher(admission=None):
+    return SearchPrefetcher(MessageCoherenceProtocol(), admission or AdmissionController(),
+                            stable_drafts=1, min_draft_interval=0, min_launch_interval=0)
+
+
+def counted(before, after):
+    return {key: after[key] - before[key] for key in ("hits", "misses", "launched")}
+
+
+def test_connection_without_prefetches_is_not_counted(searches):
+    async def run():
+        return await prefetcher().take(QUERY)
+
+    before = prefetch_stats()
+    assert asyncio.run(run()) is None
+    assert counted(before, prefetch_stats()) == {"hits": 0, "misses": 0, "launched": 0}
+
+
+def test_hits_and_misses_are_counted_after_a_launch(searches):
+    async def run():
+        p = prefetcher()
+        p.on_draft(QUERY)
+        await asyncio.sleep(0.05)
+        hit = await p.take(QUERY)
+        miss = await p.take("what is the capital of Spain?")
+        p.close()
+        return hit, miss
+
+    before = prefetch_stats()
+    hit, miss = asyncio.run(run())
+
+    assert hit is not None and miss is None
+    assert counted(before, prefetch_stats()) == {"hits": 1, "misses": 1, "launched": 1}
+    assert searches == [QUERY]
+
+
+def test_speculative_search_never_takes_a_busy_search_slot(searches):
+    admission = AdmissionController({"search": (1, 4, 5.0)})
+
+    async def run():
+        p = prefetcher(admission)
+        # A foreground search holds the only slot
+        async with admission.slot("search"):
+            p.on_draft(QUERY)
+            await asyncio.sleep(0.05)
+        result = await p.take(QUERY)
+        p.close()
+        return result
+
+    assert asyncio.run(run()) is None
+    assert searches == []
+    assert admission.stats()["search"]["rejected_no_wait"] == 1
+
+
+def test_agent_searches_hold_a_search_slot(searches, monkeypatch):
+    admission = AdmissionController({"search": (1, 0, 5.0)})
+    agent = Agent(admission=admission)
+    in_flight = []
+
+    fake_search = model.agent.search_web_async
+
+    async def observed_search(query, num_results=5):
+        in_flight.append(admission.stats()["search"]["in_flight"])
+        return await fake_search(query, num_results)
+
+    monkeypatch.setattr(model.agent, "search_web_async", observed_search)
+
+    async def run():
+        await agent.process_message_async(QUERY, "search-slot")
+        # With the only slot taken and no queue, the agent's search is turned away
+        async with admission.slot("search"):
+            with pytest.raises(AdmissionRejected):
+                await agent.process_message_async(QUERY, "search-slot")
+
+    asyncio.run(run())
+
+    assert in_flight == [1]
+    assert admission.stats()["search"]["in_flight"] == 0
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from model.agent import Agent
+from model.context import make_turn
+from model.records import Role
+from utils.session_store import SessionStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+@pytest.fixture
+def make_worker(db_path):
+    """Agents with their own store on one database, like workers started by serve.py."""
+    stores = []
+
+    def make(**kwargs):
+        store = SessionStore(db_path)
+        stores.append(store)
+        return Agent(session_store=store, **kwargs)
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def contents(turns):
+    return [turn.content for turn in turns]
+
+
+def test_cached_history_picks_up_turns_from_another_worker(make_worker):
+    a, b = make_worker(), make_worker()
+
+    a.process_message("from a", "s")
+    a.session_store.flush()
+    b.process_message("from b", "s")
+    b.session_store.flush()
+
+    history = contents(a._get_history("s"))
+    assert history[0::2] == ["from a", "from b"]
+    assert contents(b._get_history("s")) == history
+
+
+def test_own_turns_do_not_reload_the_cached_history(make_worker, monkeypatch):
+    a = make_worker()
+    a.process_message("first", "s")
+    a.session_store.flush()
+
+    loads = []
+    load_recent = a.session_store.load_recent
+    monkeypatch.setattr(a.session_store, "load_recent", lambda *args: loads.append(args) or load_recent(*args))
+
+    a.process_message("second", "s")
+    a.session_store.flush()
+
+    assert contents(a._get_history("s"))[0::2] == ["first", "second"]
+    assert loads == []
+
+
+def test_history_is_trimmed_to_the_window(make_worker):
+    a = make_worker(history_window=4)
+    for i in range(5):
+        a.process_message(f"message {i}", "s")
+
+    assert contents(a._get_history("s"))[0::2] == ["message 3", "message 4"]
+
+
+def test_reload_waits_for_the_store_off_the_event_loop(make_worker, db_path):
+    a, b = make_worker(), make_worker()
+    a.process_message("from a", "s")
+    a.session_store.flush()
+    b.process_message("from b", "s")
+    b.session_store.flush()
+
+    # Lock the database so a's next turns can't be committed yet
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    # Recorded without a lookup, so a's cached history is still the stale one
+    a._record_exchange("s", make_turn(Role.USER, "pending in a"), "reply")
+    assert a.session_store.pending("s")
+
+    async def run():
+        # a's cache is stale and it has uncommitted turns, so the reload has to flush
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.5, blocker.rollback)
+        task = asyncio.create_task(a.process_message_async("after the lock", "s"))
+
+        longest_gap = 0.0
+        last = time.monotonic()
+        while not task.done():
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            longest_gap = max(longest_gap, now - last)
+            last = now
+        await task
+        return longest_gap
+
+    longest_gap = asyncio.run(run())
+    blocker.close()
+
+    assert longest_gap < 0.3
+    assert contents(a._get_history("s"))[0::2] == ["from a", "from b", "pending in a", "after the lock"]
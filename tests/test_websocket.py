@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+def receive_until_done(ws, request_id):
+    frames = []
+    while True:
+        frame = json.loads(ws.receive_text())
+        frames.append(frame)
+        if frame.get("id") == request_id and (frame.get("done") or "error" in frame):
+            return frames
+
+
+@pytest.mark.parametrize("frame, error", [
+    ("not json", "Frame is not valid JSON"),
+    ("[1, 2]", "Frame must be a JSON object"),
+    ('"message"', "Frame must be a JSON object"),
+])
+def test_malformed_frames_get_an_untagged_error(client, frame, error):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_text(frame)
+        assert json.loads(ws.receive_text()) == {"error": error}
+
+
+def test_bad_frame_does_not_cancel_other_requests(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_text(json.dumps({"id": "good", "session_id": "ws-test", "message": "hello"}))
+        ws.send_text("{broken")
+        ws.send_text(json.dumps({"id": "bad", "message": ["not", "a", "string"]}))
+
+        frames = receive_until_done(ws, "good")
+
+    assert {"error": "Frame is not valid JSON"} in frames
+    assert {"id": "bad", "error": "Message must be a string"} in frames
+    assert frames[-1] == {"id": "good", "done": True}
+    assert "hello" in "".join(frame.get("chunk", "") for frame in frames)
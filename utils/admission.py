@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+
+# Default limits per endpoint class: (max concurrent, max queued, max wait in seconds)
+DEFAULT_LIMITS = {
+    "chat": (8, 32, 5.0),
+    "stream": (16, 64, 5.0),
+    "search": (8, 32, 3.0),
+    "train": (1, 2, 1.0),
+}
+
+# Priorities: lower values are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted in time."""
+
+    def __init__(self, endpoint_class: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(f"{endpoint_class}: {reason}")
+        self.endpoint_class = endpoint_class
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "deadline")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future, deadline: float):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.deadline = deadline
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _EndpointClass:
+    """Concurrency slots and wait queue for one class of endpoints."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self.waiters = []  # heap of _Waiter
+        self.queued = 0  # live waiters; the heap may also hold abandoned ones
+
+        # Exponentially weighted average of service time, for Retry-After
+        self.avg_service_time = 1.0
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_no_wait = 0
+        self.shed = 0
+        self.total_wait_time = 0.0
+
+    def retry_after(self) -> int:
+        """Estimate how long until a slot frees up for a new request."""
+        backlog = (self.queued + 1) / max(self.max_concurrent, 1)
+        return max(1, int(round(backlog * self.avg_service_time)))
+
+    def reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        return AdmissionRejected(self.name, status_code, self.retry_after(), reason)
+
+    def grant_next(self) -> None:
+        """Hand free slots to the best live waiters."""
+        now = time.monotonic()
+        while self.waiters and self.in_flight < self.max_concurrent:
+            waiter = heapq.heappop(self.waiters)
+            if waiter.future.done():
+                # Timed out, cancelled or shed; already uncounted
+                continue
+            self.queued -= 1
+            if waiter.deadline < now:
+                self.rejected_timeout += 1
+                waiter.future.set_exception(self.reject(503, "queue deadline exceeded"))
+                continue
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def shed_lowest(self, priority: int) -> bool:
+        """
+        Make room in a full queue by rejecting the lowest-priority waiter.
+
+        Only waiters with a strictly worse priority than the newcomer are shed.
+        """
+        live = [w for w in self.waiters if not w.future.done()]
+        if not live:
+            return False
+        worst = max(live)
+        if worst.priority <= priority:
+            return False
+        self.queued -= 1
+        self.shed += 1
+        worst.future.set_exception(self.reject(503, "shed for higher priority request"))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_no_wait": self.rejected_no_wait,
+            "shed": self.shed,
+            "avg_wait_time": self.total_wait_time / self.admitted if self.admitted else 0.0,
+            "avg_service_time": self.avg_service_time,
+        }
+
+
+class AdmissionController:
+    """
+    Bounded concurrency per endpoint class with a priority wait queue.
+
+    Requests that find a free slot start immediately. Otherwise they wait in
+    a bounded queue ordered by priority, and are rejected if the queue is full
+    (429) or if no slot frees up before their deadline (503). Rejections carry
+    a Retry-After estimate so clients can back off instead of piling up.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        limits = limits or DEFAULT_LIMITS
+        self.classes = {
+            name: _EndpointClass(name, *limit)
+            for name, limit in limits.items()
+        }
+        self._seq = itertools.count()
+
+    async def acquire(self, endpoint_class: str, priority: int = PRIORITY_NORMAL,
+                      timeout: Optional[float] = None) -> None:
+        """
+        Wait for a slot in the given endpoint class.
+
+        Args:
+            endpoint_class: One of the configured classes (chat, stream, ...)
+            priority: Lower values are admitted first
+            timeout: Maximum time to wait; defaults to the class limit, and 0
+                only takes an idle slot without queueing
+
+        Raises:
+            AdmissionRejected: If the request cannot start in time
+        """
+        ec = self.classes[endpoint_class]
+        start = time.monotonic()
+
+        if ec.in_flight < ec.max_concurrent and ec.queued == 0:
+            ec.in_flight += 1
+            ec.admitted += 1
+            return
+
+        if timeout is not None and timeout <= 0:
+            ec.rejected_no_wait += 1
+            raise ec.reject(503, "no idle capacity")
+
+        if ec.queued >= ec.max_queue and not ec.shed_lowest(priority):
+            ec.rejected_queue_full += 1
+            raise ec.reject(429, "queue full")
+
+        wait = ec.max_wait if timeout is None else timeout
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, next(self._seq), future, start + wait)
+        heapq.heappush(ec.waiters, waiter)
+        ec.queued += 1
+
+        # asyncio.wait, unlike wait_for, always raises when we are cancelled,
+        # even if the slot was granted in the same iteration of the loop
+        try:
+            await asyncio.wait((future,), timeout=wait)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+                ec.queued -= 1
+            elif not future.cancelled() and future.exception() is None:
+                # We were granted a slot but will never use it
+                self.release(endpoint_class)
+            raise
+        if not future.done():
+            future.cancel()
+            ec.queued -= 1
+            ec.rejected_timeout += 1
+            raise ec.reject(503, "queue deadline exceeded")
+
+        # Either granted or rejected while we waited
+        future.result()
+        ec.admitted += 1
+        ec.total_wait_time += time.monotonic() - start
+
+    def release(self, endpoint_class: str, service_time: Optional[float] = None) -> None:
+        """Free a slot and admit the next waiter, if any."""
+        ec = self.classes[endpoint_class]
+        ec.in_flight -= 1
+        if service_time is not None:
+            ec.avg_service_time = 0.8 * ec.avg_service_time + 0.2 * service_time
+        ec.grant_next()
+
+    @asynccontextmanager
+    async def slot(self, endpoint_class: str, priority: int = PRIORITY_NORMAL,
+                   timeout: Optional[float] = None):
+        """Hold a slot for the duration of the ``async with`` block."""
+        await self.acquire(endpoint_class, priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(endpoint_class, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, in-flight and rejection counters for every class."""
+        return {name: ec.stats() for name, ec in self.classes.items()}
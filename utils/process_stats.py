@@ -0,0 +1,51 @@
+import os
+import time
+from typing import Dict, Any, Optional
+
+
+_started = time.time()
+_startup_time: Optional[float] = None
+
+
+def record_startup(seconds: float) -> None:
+    """Record how long this worker took to become ready."""
+    global _startup_time
+    _startup_time = seconds
+
+
+def memory_usage() -> Dict[str, float]:
+    """
+    Resident memory of this process, split into shared and private pages.
+
+    Shared pages include those a forked worker still shares copy-on-write
+    with its master. Only available on Linux; returns an empty dict elsewhere.
+
+    Returns:
+        Sizes in MB
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "shared_mb": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def process_stats() -> Dict[str, Any]:
+    """Pid, uptime, startup time and memory of this worker."""
+    return {
+        "pid": os.getpid(),
+        "uptime": time.time() - _started,
+        "startup_time": _startup_time,
+        **memory_usage(),
+    }
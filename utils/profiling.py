@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Dict, Any
+
+
+class RequestProfile:
+    """Wall-clock time spent in each stage of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []  # (name, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the body of the ``with`` block as the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": (time.perf_counter() - self.started) * 1000,
+            "stages": [{"name": name, "ms": seconds * 1000} for name, seconds in self.stages],
+        }
+
+
+class _NullProfile:
+    """Stand-in used when profiling is off; every stage is a shared no-op."""
+
+    _stage = nullcontext()
+
+    def stage(self, name: str):
+        return self._stage
+
+
+NULL_PROFILE = _NullProfile()
+
+_current_profile: ContextVar = ContextVar("request_profile", default=NULL_PROFILE)
+
+
+def current_profile():
+    """The profile of the request being handled, or a no-op one."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profiling(enabled: bool = True):
+    """
+    Collect a stage profile for the code run inside the ``with`` block.
+
+    The profile follows the request into tasks and ``asyncio.to_thread``
+    calls started from the block, since they copy the current context.
+
+    Args:
+        enabled: Whether to profile; if False a no-op profile is used
+
+    Returns:
+        A context manager yielding the profile
+    """
+    if not enabled:
+        yield NULL_PROFILE
+        return
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def _collapse(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> str:
+    """
+    Sample the stacks of every thread in this process.
+
+    Args:
+        seconds: How long to sample for
+        interval: Time between samples
+
+    Returns:
+        Collapsed stacks, one "frame;frame;... count" line per distinct stack,
+        as consumed by flamegraph.pl and speedscope
+    """
+    own = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = [names.get(ident, str(ident))] + _collapse(frame)
+            counts[";".join(stack)] += 1
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+from .admission import AdmissionController, AdmissionRejected, PRIORITY_LOW
+from .web_search import search_web_async
+
+
+# Counters shared by every connection
+_stats = {
+    "drafts": 0,
+    "drafts_rate_limited": 0,
+    "launched": 0,
+    "launches_rate_limited": 0,
+    "cancelled": 0,
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    """Draft, launch and hit counters across all connections."""
+    lookups = _stats["hits"] + _stats["misses"]
+    return dict(_stats, hit_rate=_stats["hits"] / lookups if lookups else 0.0)
+
+
+class SearchPrefetcher:
+    """
+    Speculative web search driven by the user's partial input.
+
+    Each draft is run through the MCP. Once its search decision has held for
+    ``stable_drafts`` drafts in a row, a low-priority search for the predicted
+    query starts in the background. When the final message arrives, ``take``
+    hands back the warm result if the final query matches a prefetched one.
+
+    Drafts are processed at most every ``min_draft_interval`` seconds and
+    searches start at most every ``min_launch_interval`` seconds per
+    connection; a prediction that arrives too soon is deferred until the
+    interval has passed, replacing any earlier deferred one. Speculative
+    searches never queue for admission, so they only use search capacity
+    that is idle: foreground searches, from the agent and /api/search,
+    hold the same "search" slots.
+
+    Hits and misses are only counted on connections that have launched a
+    speculative search, so the hit rate reflects the predictions made.
+    """
+
+    def __init__(self, mcp, admission: AdmissionController, stable_drafts: int = 2,
+                 min_draft_interval: float = 0.2, min_launch_interval: float = 1.0,
+                 max_prefetched: int = 2):
+        """
+        Args:
+            mcp: The MessageCoherenceProtocol used to predict the search
+            admission: Admission controller that search slots are taken from
+            stable_drafts: Consecutive drafts that must agree before searching
+            min_draft_interval: Minimum time between processed drafts
+            min_launch_interval: Minimum time between speculative searches
+            max_prefetched: Prefetched queries kept per connection
+        """
+        self.mcp = mcp
+        self.admission = admission
+        self.stable_drafts = stable_drafts
+        self.min_draft_interval = min_draft_interval
+        self.min_launch_interval = min_launch_interval
+        self.max_prefetched = max_prefetched
+
+        self._last_draft = 0.0
+        self._last_launch = 0.0
+        self._streak = 0
+        self._prefetched = OrderedDict()  # query -> asyncio.Task
+        self._launched_any = False
+        self._deferred: Optional[asyncio.TimerHandle] = None
+
+    def on_draft(self, text: str) -> None:
+        """
+        Handle a partial message from the client.
+
+        Args:
+            text: The text typed so far
+        """
+        now = time.monotonic()
+        if now - self._last_draft < self.min_draft_interval:
+            _stats["drafts_rate_limited"] += 1
+            return
+        self._last_draft = now
+        _stats["drafts"] += 1
+
+        # The search prediction doesn't depend on history
+        result = self.mcp.process(text, [])
+        if not result["needs_search"] or not result["search_query"]:
+            self._streak = 0
+            self._cancel_deferred()
+            return
+        self._streak += 1
+
+        query = result["search_query"]
+        if self._streak < self.stable_drafts or query in self._prefetched:
+            return
+
+        self._cancel_deferred()
+        wait = self._last_launch + self.min_launch_interval - now
+        if wait > 0:
+            _stats["launches_rate_limited"] += 1
+            self._deferred = asyncio.get_running_loop().call_later(wait, self._launch, query)
+            return
+        self._launch(query)
+
+    def _cancel_deferred(self) -> None:
+        if self._deferred is not None:
+            self._deferred.cancel()
+            self._deferred = None
+
+    def _launch(self, query: str) -> None:
+        self._deferred = None
+        self._last_launch = time.monotonic()
+
+        # Keep only the most recent predictions; older ones are unlikely to match
+        while len(self._prefetched) >= self.max_prefetched:
+            _, task = self._prefetched.popitem(last=False)
+            if not task.done():
+                task.cancel()
+                _stats["cancelled"] += 1
+        self._prefetched[query] = asyncio.create_task(self._search(query))
+        self._launched_any = True
+        _stats["launched"] += 1
+
+    async def _search(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            async with self.admission.slot("search", priority=PRIORITY_LOW, timeout=0):
+                return await search_web_async(query)
+        except AdmissionRejected:
+            return None
+
+    async def take(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Claim the prefetched result for a final query.
+
+        Args:
+            query: The search query of the final message
+
+        Returns:
+            The search results, or None if nothing usable was prefetched
+        """
+        # Connections that never predicted anything say nothing about accuracy
+        if not self._launched_any:
+            return None
+
+        task = self._prefetched.pop(query, None)
+        results = None
+        if task is not None and not task.cancelled():
+            try:
+                results = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Re-raise if it was us, not the prefetch, that got cancelled
+                if not task.cancelled():
+                    task.cancel()
+                    raise
+            except Exception:
+                results = None
+
+        _stats["hits" if results is not None else "misses"] += 1
+        return results
+
+    def close(self) -> None:
+        """Cancel every outstanding speculative search."""
+        self._cancel_deferred()
+        for task in self._prefetched.values():
+            if not task.done():
+                task.cancel()
+                _stats["cancelled"] += 1
+        self._prefetched.clear()
@@ -0,0 +1,369 @@
+import argparse
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER,
+    created_at REAL NOT NULL,
+    writer INTEGER
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    # WAL lets readers run alongside the writer, and with synchronous=NORMAL
+    # a commit appends to the log without an fsync; only checkpoints sync
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SessionStore:
+    """
+    Durable conversation turns in SQLite, written with group commit.
+
+    ``append`` only enqueues the turn. A background writer drains the queue
+    and commits everything that arrived within ``flush_interval`` seconds in
+    a single transaction, so the chat path never waits on the disk. Turns
+    committed by one worker become visible to the others after at most one
+    flush interval, and each row records which process wrote it so a worker
+    can tell whether others have added to a session it has cached.
+
+    A batch that fails because the database is busy (another worker holds
+    the write lock, or a compaction is running) is retried with backoff for
+    up to ``retry_for`` seconds; the turns stay queued meanwhile.
+
+    Connections and the writer thread are created lazily in the process that
+    first uses the store, so a store built before forking workers is safe.
+    """
+
+    def __init__(self, db_path: str = "data/sessions.db", flush_interval: float = 0.05,
+                 max_batch: int = 1024, retry_for: float = 60.0, max_retry_delay: float = 2.0):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            flush_interval: Longest time a turn waits in memory before commit
+            max_batch: Maximum number of turns per transaction
+            retry_for: How long to keep retrying a batch while the database is busy
+            max_retry_delay: Upper bound on the wait between retries
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retry_for = retry_for
+        self.max_retry_delay = max_retry_delay
+
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_lock = threading.Lock()
+        self._writer_id = None
+        self._pending = Counter()
+        self._pending_lock = threading.Lock()
+
+        self.turns_written = 0
+        self.commits = 0
+        self.retries = 0
+        self.turns_dropped = 0
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = _connect(self.db_path)
+            conn.executescript(_SCHEMA)
+            # Stores created before rows recorded their writer
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(turns)")}
+            if "writer" not in columns:
+                conn.execute("ALTER TABLE turns ADD COLUMN writer INTEGER")
+            conn.commit()
+
+            # Identifies this process's rows; forked workers each pick their own
+            self._writer_id = secrets.randbits(62)
+            self._pending = Counter()
+            self._queue = queue.Queue()
+            self._reader = conn
+            self._writer = threading.Thread(target=self._run, name="session-store-writer", daemon=True)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def append(self, session_id: str, role: str, content: str, tokens: Optional[int] = None) -> None:
+        """
+        Queue a turn for persistence.
+
+        Args:
+            session_id: The conversation the turn belongs to
+            role: "user" or "assistant"
+            content: The turn text
+            tokens: Cached token count of the turn
+        """
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending[session_id] += 1
+        self._queue.put((session_id, role, content, tokens, time.time(), self._writer_id))
+
+    def _run(self) -> None:
+        conn = _connect(self.db_path)
+        q = self._queue
+        stop = False
+        while not stop:
+            item = q.get()
+
+            # Group commit: collect whatever arrives within the flush interval,
+            # cutting the batch short when someone is waiting on a flush
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+
+            # Nothing may stop the writer: flush() and close() wait on it
+            try:
+                if batch:
+                    self._write(conn, batch)
+            except Exception:
+                self.turns_dropped += len(batch)
+                print(f"Error writing {len(batch)} turns to {self.db_path}:")
+                traceback.print_exc()
+            finally:
+                self._settle(batch)
+                for waiter in waiters:
+                    waiter.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        delay = self.flush_interval
+        give_up = time.monotonic() + self.retry_for
+        while True:
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO turns (session_id, role, content, tokens, created_at, writer) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                self.turns_written += len(batch)
+                self.commits += 1
+                return
+            except sqlite3.OperationalError as e:
+                # Busy or locked; sqlite's own busy timeout has already run out
+                if time.monotonic() + delay > give_up:
+                    raise
+                print(f"Error writing {len(batch)} turns to {self.db_path}: {e}; retrying in {delay:.2f}s")
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            except sqlite3.Error:
+                if len(batch) == 1:
+                    raise
+                # A turn that can't be stored shouldn't take the rest of the batch with it
+                for item in batch:
+                    try:
+                        self._write(conn, [item])
+                    except sqlite3.Error as e:
+                        self.turns_dropped += 1
+                        print(f"Error writing a turn of session {item[0]} to {self.db_path}: {e}")
+                return
+
+    def _settle(self, batch: List[tuple]) -> None:
+        """Mark a batch's turns as no longer pending, whether or not they were stored."""
+        with self._pending_lock:
+            for item in batch:
+                self._pending[item[0]] -= 1
+                if self._pending[item[0]] <= 0:
+                    del self._pending[item[0]]
+
+    def flush(self) -> None:
+        """Block until every turn queued so far has been committed."""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(1.0):
+            if not self._writer.is_alive():
+                raise RuntimeError(f"Session store writer for {self.db_path} has stopped")
+
+    def pending(self, session_id: str) -> int:
+        """Number of this process's turns for a session that are not committed yet."""
+        with self._pending_lock:
+            return self._pending.get(session_id, 0)
+
+    def load_recent(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Load the most recent turns of a session.
+
+        Args:
+            session_id: The conversation to load
+            limit: Maximum number of turns to return
+
+        Returns:
+            The turns, oldest first
+        """
+        self._ensure_started()
+        with self._reader_lock:
+            rows = self._reader.execute(
+                "SELECT id, role, content, tokens FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+        return [{"id": turn_id, "role": role, "content": content, "tokens": tokens}
+                for turn_id, role, content, tokens in reversed(rows)]
+
+    def written_elsewhere(self, session_id: str, after_id: int) -> int:
+        """
+        Count a session's turns committed by other processes after a given turn.
+
+        Args:
+            session_id: The conversation to check
+            after_id: Id of the newest turn the caller has seen
+
+        Returns:
+            The number of newer turns this process didn't write
+        """
+        self._ensure_started()
+        with self._reader_lock:
+            return self._reader.execute(
+                "SELECT COUNT(*) FROM turns WHERE session_id = ? AND id > ? AND writer IS NOT ?",
+                (session_id, after_id, self._writer_id),
+            ).fetchone()[0]
+
+    def compact(self, keep_last: int = 200, max_age_days: Optional[float] = None) -> int:
+        """
+        Trim old data from the store.
+
+        Args:
+            keep_last: Turns to keep per session
+            max_age_days: Drop whole sessions idle for longer than this
+
+        Returns:
+            The number of turns deleted
+        """
+        self._ensure_started()
+        self.flush()
+        with self._reader_lock:
+            conn = self._reader
+            with conn:
+                deleted = conn.execute(
+                    """
+                    DELETE FROM turns WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS rank
+                            FROM turns
+                        ) WHERE rank > ?
+                    )
+                    """,
+                    (keep_last,),
+                ).rowcount
+                if max_age_days is not None:
+                    cutoff = time.time() - max_age_days * 86400
+                    deleted += conn.execute(
+                        """
+                        DELETE FROM turns WHERE session_id IN (
+                            SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?
+                        )
+                        """,
+                        (cutoff,),
+                    ).rowcount
+            # Fold the WAL back into the main file and shrink it
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def close(self) -> None:
+        """Commit pending turns and stop the writer."""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._writer.join()
+        with self._reader_lock:
+            self._reader.close()
+        self._pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "turns_written": self.turns_written,
+            "commits": self.commits,
+            "avg_turns_per_commit": self.turns_written / self.commits if self.commits else 0.0,
+            "retries": self.retries,
+            "turns_dropped": self.turns_dropped,
+            "pending": self._queue.qsize() if self._pid == os.getpid() else 0,
+        }
+
+
+def _benchmark(db_path: str, num_turns: int, num_sessions: int) -> None:
+    store = SessionStore(db_path)
+    content = "This is a typical chat turn with a sentence or two of text in it."
+
+    start = time.perf_counter()
+    for i in range(num_turns):
+        store.append(f"session-{i % num_sessions}", "user" if i % 2 == 0 else "assistant", content, 14)
+    enqueued = time.perf_counter() - start
+    store.flush()
+    committed = time.perf_counter() - start
+
+    print(f"{num_turns} turns: enqueue {num_turns / enqueued:.0f} turns/s, "
+          f"committed {num_turns / committed:.0f} turns/s in {store.commits} commits")
+
+    start = time.perf_counter()
+    for i in range(num_sessions):
+        store.load_recent(f"session-{i}", 50)
+    print(f"load_recent: {(time.perf_counter() - start) / num_sessions * 1000:.2f}ms per session")
+
+    store.close()
+
+
+def main() -> None:
+    """Benchmark or compact a session store."""
+    parser = argparse.ArgumentParser(description="Session store maintenance")
+    parser.add_argument("command", choices=["bench", "compact"])
+    parser.add_argument("--db", default="data/sessions.db")
+    parser.add_argument("--turns", type=int, default=50000)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--keep-last", type=int, default=200)
+    parser.add_argument("--max-age-days", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _benchmark(args.db, args.turns, args.sessions)
+    else:
+        store = SessionStore(args.db)
+        deleted = store.compact(args.keep_last, args.max_age_days)
+        store.close()
+        print(f"Deleted {deleted} turns from {args.db}")
+
+
+if __name__ == "__main__":
+    main()
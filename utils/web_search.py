@@ -1,5 +1,5 @@
-import requests
 from typing import List, Dict, Any
+import asyncio
 import os
 import json
 import time
@@ -33,8 +33,37 @@ def search_web(query: str, num_results: int = 5) -> List[Dict[str, Any]]:
     # Simulate API call delay
     time.sleep(1)
 
-    # Mock results
-    mock_results = [
+    # Limit to requested number of results
+    return _mock_results(query)[:num_results]
+
+
+async def search_web_async(query: str, num_results: int = 5) -> List[Dict[str, Any]]:
+    """
+    Search the web without blocking the event loop.
+
+    Unlike running search_web in a thread, cancelling the awaiting task
+    aborts the search itself, so abandoned searches stop using the
+    connection and the admission slot they were started under. A real
+    implementation should make the request with an async client such as
+    httpx.AsyncClient for the same reason.
+
+    Args:
+        query: The search query
+        num_results: The number of results to return
+
+    Returns:
+        A list of search results
+    """
+    print(f"Searching the web for: '{query}'")
+
+    # Simulate API call delay
+    await asyncio.sleep(1)
+
+    return _mock_results(query)[:num_results]
+
+
+def _mock_results(query: str) -> List[Dict[str, Any]]:
+    return [
         {
             "title": f"Result 1 for {query}",
             "snippet": f"This is a snippet of information about {query}. It contains relevant details that might be useful for answering the user's question.",
@@ -52,9 +81,6 @@ def search_web(query: str, num_results: int = 5) -> List[Dict[str, Any]]:
         }
     ]
 
-    # Limit to requested number of results
-    return mock_results[:num_results]
-
 
 def fetch_content(url: str) -> str:
     """
@@ -67,6 +93,9 @@ def fetch_content(url: str) -> str:
         The content of the webpage
     """
     try:
+        # Only needed here, so serving doesn't pay for importing it
+        import requests
+
         response = requests.get(url, timeout=5)
         response.raise_for_status()
         return response.text